@@ -0,0 +1,85 @@
+#
+# Benchmark of XML escaping on values of generated vcxproj and filters files
+#
+# Values passed to easy_xml._xml_escape while generating MSVC projects for
+# synthetic project (tests/fixture.py) are recorded and then escaped repeatedly
+# by the current implementation and by the previous regex substitution.
+#
+
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_root, "tests"))
+sys.path.insert(0, _root)
+
+import fixture
+from impl import easy_xml
+from impl.common import Project
+from impl.msvc import ProjectGenerator
+
+# Escaping before the fast path; every value went through regex substitution with callback
+_regex_escape_re = re.compile('(%s)' % '|'.join(map(re.escape, easy_xml._xml_escape_map.keys())))
+
+def regex_escape(value, attr=False):
+    def replace(match):
+        m = match.string[match.start(): match.end()]
+        if attr and m == "'":
+            return m
+        return easy_xml._xml_escape_map[m]
+    return _regex_escape_re.sub(replace, value)
+
+# Returns (value, attr) pairs escaped while generating projects for target_count targets
+def record_values(target_count):
+    root = tempfile.mkdtemp()
+    values = []
+    escape = easy_xml._xml_escape
+    def recording_escape(value, attr=False):
+        values.append((value, attr))
+        return escape(value, attr)
+    easy_xml._xml_escape = recording_escape
+    try:
+        project_file = fixture.create_project(root, target_count)[0]
+        with open(project_file) as f:
+            project = Project(json.load(f))
+        ProjectGenerator(project, "Solution", tools_version="15.0", platform_toolset="v141",
+                         target_platform_version="10.0.17134.0").generate()
+    finally:
+        easy_xml._xml_escape = escape
+        shutil.rmtree(root)
+    return values
+
+def measure(function, values, rounds):
+    start = time.time()
+    for i in range(rounds):
+        for value, attr in values:
+            function(value, attr)
+    return time.time() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of XML escaping")
+    parser.add_argument("--targets", type=int, default=40, help="Number of targets in synthetic project")
+    parser.add_argument("--rounds", type=int, default=200, help="Number of times every value is escaped")
+    args = parser.parse_args()
+
+    values = record_values(args.targets)
+    plain = [v for v in values if easy_xml._xml_escape_chars.isdisjoint(v[0])]
+    escaped = [v for v in values if not easy_xml._xml_escape_chars.isdisjoint(v[0])]
+
+    for function in (regex_escape, easy_xml._xml_escape):
+        for value, attr in values:
+            assert function(value, attr) == regex_escape(value, attr)
+
+    print("%d values, %d need escaping, %d rounds" % (len(values), len(escaped), args.rounds))
+    for name, subset in (("values needing no escaping", plain), ("values needing escaping", escaped)):
+        print("%s: regex %.3fs, current %.3fs" % (name, measure(regex_escape, subset, args.rounds),
+                                                 measure(easy_xml._xml_escape, subset, args.rounds)))
+
+if __name__ == "__main__":
+    main()
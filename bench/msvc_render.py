@@ -0,0 +1,72 @@
+#
+# Benchmark of rendering MSVC projects
+#
+# Times ProjectGenerator._write_project (building and serializing .vcxproj and
+# .filters) for every project of synthetic project (tests/fixture.py). Outputs
+# are written in dry run mode, so nothing but rendering and hashing is measured.
+#
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_root, "tests"))
+sys.path.insert(0, _root)
+
+import fixture
+from impl.common import Project
+from impl.msvc import ProjectGenerator
+from impl.msvc_env import StubEnvironmentProvider
+from impl.output import OutputWriter
+
+# Returns render times of all projects in seconds; fragments shared by projects
+# are rendered as part of the first one, as in real run; solution is not timed
+def render_projects(project):
+    outputs = OutputWriter(project.get_absolute_build_path() + "bench.outputs.json", dry_run=True)
+    generator = ProjectGenerator(project, "Solution", tools_version="15.0", platform_toolset="v141",
+                                 target_platform_version="10.0.17134.0",
+                                 env_provider=StubEnvironmentProvider(), outputs=outputs)
+    times = []
+    write_project = generator._write_project
+    def timed_write_project(target):
+        start = time.time()
+        write_project(target)
+        times.append(time.time() - start)
+    generator._write_project = timed_write_project
+    # dry run would list every project as created
+    outputs.commit = lambda: (0, 0.0)
+    generator.generate()
+    return times
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of rendering MSVC projects")
+    parser.add_argument("--targets", type=int, default=2000, help="Number of targets in synthetic project")
+    parser.add_argument("--runs", type=int, default=5, help="Number of runs; the fastest one is reported")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp()
+    try:
+        project_file = fixture.create_project(root, args.targets)[0]
+        with open(project_file) as f:
+            project = Project(json.load(f))
+
+        best = None
+        for i in range(args.runs):
+            times = render_projects(project)
+            if best is None or sum(times) < sum(best):
+                best = times
+    finally:
+        shutil.rmtree(root)
+
+    best.sort()
+    print("%d projects, best of %d runs" % (len(best), args.runs))
+    print("per project: mean %.1f us, median %.1f us, max %.1f us" %
+          (sum(best) / len(best) * 1e6, best[len(best) // 2] * 1e6, best[-1] * 1e6))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+#
+# Benchmark of memory used by PBX objects
+#
+# Builds synthetic project with file references in groups and build files in a
+# sources phase (200k files by default), assigns IDs and prints memory traced
+# by tracemalloc (Python 3 only).
+#
+
+import argparse
+import os
+import sys
+
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _root)
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of memory used by PBX objects")
+    parser.add_argument("--groups", type=int, default=2000, help="Number of groups")
+    parser.add_argument("--files", type=int, default=100, help="Number of files per group")
+    args = parser.parse_args()
+
+    if tracemalloc is None:
+        print("tracemalloc is not available in Python " + sys.version.split()[0])
+        sys.exit(1)
+
+    # module is imported after tracing starts, so that the numbers are comparable with
+    # versions that populate caches on import
+    tracemalloc.start()
+    from impl.pbx import PBXObjects, PBXGroup, PBXFileReference, PBXBuildFile, PBXSourcesBuildPhase
+
+    objects = PBXObjects()
+    root = PBXGroup(None, "root")
+    objects.add_object(root)
+    phase = PBXSourcesBuildPhase(None)
+    objects.add_object(phase)
+    for g in range(args.groups):
+        group = PBXGroup(root, "dir%d" % g)
+        objects.add_object(group)
+        root.add_child(group)
+        for f in range(args.files):
+            reference = PBXFileReference(group, "file_%d.cc" % f)
+            objects.add_object(reference)
+            group.add_child(reference)
+            build_file = PBXBuildFile(phase, reference, phase)
+            objects.add_object(build_file)
+            phase.add_file(build_file)
+    objects.assign_ids()
+
+    current, peak = tracemalloc.get_traced_memory()
+    print("%d files in %d groups, %d objects" % (args.groups * args.files, args.groups, objects.get_object_count()))
+    print("current %.1f MB, peak %.1f MB" % (current / 1e6, peak / 1e6))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#
+# Benchmark of serializing Xcode projects
+#
+# Generates Sources project for synthetic project (tests/fixture.py) and times
+# writing it with the specialized serializers of hot classes and with the
+# generic PBXObject.write_object; both must produce the same text.
+#
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_root, "tests"))
+sys.path.insert(0, _root)
+
+import fixture
+import xcode
+from impl import pbx
+from impl.common import Project
+from impl.output import OutputWriter
+
+_specialized_classes = [pbx.PBXFileReference, pbx.PBXBuildFile, pbx.PBXGroup, pbx.XCBuildConfiguration]
+
+# Returns fastest time of writing container and the written text
+def serialize(container, runs):
+    best = None
+    for i in range(runs):
+        output = StringIO()
+        start = time.time()
+        container.write_object(0, output)
+        duration = time.time() - start
+        if best is None or duration < best:
+            best = duration
+    return best, output.getvalue()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of serializing Xcode projects")
+    parser.add_argument("--targets", type=int, default=2000, help="Number of targets in synthetic project")
+    parser.add_argument("--runs", type=int, default=5, help="Number of runs; the fastest one is reported")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp()
+    try:
+        project_file = fixture.create_project(root, args.targets)[0]
+        with open(project_file) as f:
+            project = Project(json.load(f))
+        outputs = OutputWriter(project.get_absolute_build_path() + "bench.outputs.json", dry_run=True)
+        generator = xcode.ProjectGenerator(project, "Sources", outputs, incremental=False)
+        generator.generate_targets_for_indexing()
+        generator.objects.assign_ids()
+    finally:
+        shutil.rmtree(root)
+
+    specialized, text = serialize(generator.container, args.runs)
+
+    writers = [c.__dict__["write_object"] for c in _specialized_classes]
+    for c in _specialized_classes:
+        c.write_object = pbx.PBXObject.__dict__["write_object"]
+    try:
+        generic, generic_text = serialize(generator.container, args.runs)
+    finally:
+        for c, writer in zip(_specialized_classes, writers):
+            c.write_object = writer
+
+    assert text == generic_text
+    print("%d objects, %.1f MB, best of %d runs" % (generator.objects.get_object_count(), len(text) / 1e6, args.runs))
+    print("generic %.0f ms, specialized %.0f ms" % (generic * 1000, specialized * 1000))
+
+if __name__ == "__main__":
+    main()
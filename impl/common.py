@@ -226,21 +226,3 @@ class Project:
             return self.root_path + "/" + path[2:]
         else:
             return path # absolute
-
-def overwrite_file_if_different(path, new_content):
-    overwrite = True
-
-    if (os.path.exists(path)):
-        with open(path) as existing_file:
-            exiting_content = existing_file.read()
-            if exiting_content == new_content:
-                overwrite = False
-            existing_file.close()
-
-    if overwrite:
-        f = open(path, "w")
-        f.write(new_content)
-        f.close()
-        return True
-    else:
-        return False
@@ -15,9 +15,14 @@ except NameError:
     unicode = str
 
 try:
-    reduce
+    xrange
 except NameError:
-    from functools import reduce as reduce
+    xrange = range
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
 
 def xml_to_string(content, encoding='utf-8', pretty=False):
     """Writes the XML content to disk, touching the file only if it has
@@ -59,94 +64,139 @@ def xml_to_string(content, encoding='utf-8', pretty=False):
       The XML content as a string.
 
     """
-    # We create a huge list of all the elements of the file.
-    xml_parts = ['<?xml version="1.0" encoding="%s"?>' % encoding]
-    if pretty:
-        xml_parts.append('\n')
-    _construct_content_list(xml_parts, content, pretty)
+    output = StringIO()
+    write_xml(content, output, encoding, pretty)
+    res = output.getvalue()
+    output.close()
+    return res
 
-    # Convert it to a string
-    return ''.join(xml_parts)
 
+def write_xml(content, sink, encoding='utf-8', pretty=False, win32=False):
+    """Streams the XML content to sink.
 
-def _construct_content_list(xml_parts, specification, pretty, level=0):
-    """Appends the XML parts corresponding to the specification.
+    The content is walked iteratively and written fragment by fragment, so
+    memory used does not depend on the size of the document.  If sink has
+    flush() method, it is called after every element.
 
     Args:
-      xml_parts: A list of XML parts to be appended to.
-      specification:  The specification of the element.  See EasyXml docs.
+      content:  The structured content to be written.  See xml_to_string docs.
+      sink: Object with write() method accepting strings.
+      encoding: The encoding to report on the first XML line.
       pretty: True if we want pretty printing with indents and new lines.
-      level: Indentation level.
+      win32: True to use \\r\\n line endings on platforms where text files
+        do not translate them.
 
     """
-    # The first item in a specification is the name of the element.
-    if pretty:
-        indentation = '  ' * level
-        new_line = '\n'
-    else:
-        indentation = ''
-        new_line = ''
-    name = specification[0]
-    if not isinstance(name, str) and not isinstance(name, unicode):
-        raise Exception('The first item of an EasyXml specification should be '
-                        'a string.  Specification was ' + str(specification))
-    xml_parts.append(indentation + '<' + name)
-
-    # Optionally in second position is a dictionary of the attributes.
-    rest = specification[1:]
-    if rest and isinstance(rest[0], dict):
-        for at, val in sorted(rest[0].items()):
-            xml_parts.append(' %s="%s"' % (at, _xml_escape(val, attr=True)))
-        rest = rest[1:]
-    if rest:
-        xml_parts.append('>')
-        all_strings = reduce(lambda x, y: x and (isinstance(y, str) or isinstance(y, unicode)), rest, True)
-        multi_line = not all_strings
-        if multi_line and new_line:
-            xml_parts.append(new_line)
-        for child_spec in rest:
-            # If it's a string, append a text node.
-            # Otherwise recurse over that child definition
-            if isinstance(child_spec, str) or isinstance(child_spec, unicode):
-                xml_parts.append(_xml_escape(child_spec))
-            else:
-                _construct_content_list(
-                    xml_parts, child_spec, pretty, level + 1)
-        if multi_line and indentation:
-            xml_parts.append(indentation)
-        xml_parts.append('</%s>%s' % (name, new_line))
-    else:
-        xml_parts.append(' />%s' % new_line)
+    new_line = _new_line(pretty, win32)
+    sink.write('<?xml version="1.0" encoding="%s"?>' % encoding)
+    sink.write(new_line)
+    _write_element(content, sink, 0, pretty, new_line)
 
 
-def write_xml_if_changed(content, path, encoding='utf-8', pretty=False, win32=False):
-    """Writes the XML content to disk, touching the file only if it has
-    changed.
+class XmlFragment:
+    """Already rendered XML element.
 
-    Args:
-      content:  The structured content to be written.
-      path: Location of the file.
-      encoding: The encoding to report on the first line of the XML file.
-      pretty: True if we want pretty printing with indents and new lines.
+    Fragments can be used as child elements in EasyXml specification; their
+    text is written as it is.  This allows rendering parts of a document that
+    are the same in many documents only once.
+    """
+
+    def __init__(self, text):
+        self.text = text
+
+
+def render_fragment(specification, level=0, pretty=False, win32=False):
+    """Renders element (and its children) as it would be written at given
+    indentation level of a document.
+
+    Returns:
+      XmlFragment with the rendered text.
 
     """
-    xml_string = xml_to_string(content, encoding, pretty)
-    if win32 and os.linesep != '\r\n':
-        xml_string = xml_string.replace('\n', '\r\n')
+    output = StringIO()
+    _write_element(specification, output, level, pretty, _new_line(pretty, win32))
+    res = XmlFragment(output.getvalue())
+    output.close()
+    return res
+
 
-    # Get the old content
-    try:
-        f = open(path, 'r')
-        existing = f.read()
-        f.close()
-    except:
-        existing = None
+class XmlTemplate:
+    """Rendered XML element with placeholder in attribute values.
 
-    # It has changed, write it
-    if existing != xml_string:
-        f = open(path, 'w')
-        f.write(xml_string)
-        f.close()
+    The placeholder must be a string that is not changed by escaping.
+    """
+
+    def __init__(self, specification, placeholder, level=0, pretty=False, win32=False):
+        self._parts = render_fragment(specification, level, pretty, win32).text.split(placeholder)
+
+    def substitute(self, value):
+        """Returns XmlFragment with placeholder replaced by the escaped value."""
+        return XmlFragment(_xml_escape(value, attr=True).join(self._parts))
+
+
+def _new_line(pretty, win32):
+    if not pretty:
+        return ''
+    return '\r\n' if win32 and os.linesep != '\r\n' else '\n'
+
+
+def _write_element(content, sink, level, pretty, new_line):
+    # Pending work; elements are (specification, level) tuples, text nodes and
+    # closing tags are strings that are written as they are
+    flush = getattr(sink, 'flush', None)
+    stack = [(content, level)]
+    while stack:
+        item = stack.pop()
+        if not isinstance(item, tuple):
+            sink.write(item)
+            continue
+        if flush is not None:
+            flush()
+
+        specification, level = item
+        indentation = '  ' * level if pretty else ''
+
+        # The first item in a specification is the name of the element.
+        name = specification[0]
+        if not isinstance(name, str) and not isinstance(name, unicode):
+            raise Exception('The first item of an EasyXml specification should be '
+                            'a string.  Specification was ' + str(specification))
+        sink.write(indentation + '<' + name)
+
+        # Optionally in second position is a dictionary of the attributes.
+        first_child = 1
+        if len(specification) > 1 and isinstance(specification[1], dict):
+            for at, val in sorted(specification[1].items()):
+                sink.write(' %s="%s"' % (at, _xml_escape(val, attr=True)))
+            first_child = 2
+
+        if len(specification) > first_child:
+            sink.write('>')
+            multi_line = False
+            for child_spec in specification[first_child:]:
+                if not isinstance(child_spec, str) and not isinstance(child_spec, unicode):
+                    multi_line = True
+                    break
+            if multi_line:
+                sink.write(new_line)
+
+            if multi_line and indentation:
+                stack.append(indentation + '</%s>%s' % (name, new_line))
+            else:
+                stack.append('</%s>%s' % (name, new_line))
+
+            # If it's a string, append a text node; fragments are written as they are.
+            # Otherwise push child definition to be processed next
+            for index in xrange(len(specification) - 1, first_child - 1, -1):
+                child_spec = specification[index]
+                if isinstance(child_spec, str) or isinstance(child_spec, unicode):
+                    stack.append(_xml_escape(child_spec))
+                elif isinstance(child_spec, XmlFragment):
+                    stack.append(child_spec.text)
+                else:
+                    stack.append((child_spec, level + 1))
+        else:
+            sink.write(' />%s' % new_line)
 
 
 _xml_escape_map = {
@@ -164,8 +214,24 @@ _xml_escape_re = re.compile(
     '(%s)' % '|'.join(map(re.escape, _xml_escape_map.keys())))
 
 
+_xml_escape_chars = frozenset(_xml_escape_map.keys())
+
+# translation tables for unicode.translate; single quotes are not replaced in attrs
+_xml_escape_text_table = dict((ord(k), unicode(v)) for k, v in _xml_escape_map.items())
+_xml_escape_attr_table = dict(_xml_escape_text_table)
+del _xml_escape_attr_table[ord("'")]
+
+
 def _xml_escape(value, attr=False):
     """Escape a string for inclusion in XML."""
+    # Most values (paths, defines) don't need any escaping
+    if _xml_escape_chars.isdisjoint(value):
+        return value
+
+    if isinstance(value, unicode):
+        return value.translate(_xml_escape_attr_table if attr else _xml_escape_text_table)
+
+    # byte strings (python 2) can not be translated using the tables
     def replace(match):
         m = match.string[match.start(): match.end()]
         # don't replace single quotes in attrs
@@ -0,0 +1,69 @@
+#
+# Deterministic GUIDs for MSVC projects, filters and solution folders
+#
+
+import json
+import os
+import uuid
+
+PROJECT_NAMESPACE = uuid.UUID('7a64fe6e-cba3-5019-90fa-640c295a343e')
+SOLUTION_FOLDER_NAMESPACE = uuid.UUID('53acf19b-cba3-5019-90fa-640c295a343e')
+
+class GuidTable:
+    """Computes namespaced uuid5 GUIDs once per run and caches them.
+
+    When path is given, the table from previous run is loaded from it and the
+    GUIDs computed during this run can be saved back through OutputWriter. Comparing the two
+    (see verify()) tells whether GUIDs stayed stable as the generator changed.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._guids = {}
+        self._previous = {}
+
+        if path is not None and os.path.exists(path):
+            with open(path, "r") as f:
+                self._previous = json.load(f)
+
+    @staticmethod
+    def _key(namespace, name):
+        return str(namespace) + " " + name
+
+    def get(self, namespace, name):
+        key = (namespace, name)
+        res = self._guids.get(key)
+        if res is None:
+            res = uuid.uuid5(namespace, name)
+            self._guids[key] = res
+        return res
+
+    def project_guid(self, project_file_path):
+        return self.get(PROJECT_NAMESPACE, str(project_file_path))
+
+    def filter_guid(self, project_guid, filter_path):
+        return self.get(project_guid, str(filter_path))
+
+    def solution_folder_guid(self, folder_path):
+        return self.get(SOLUTION_FOLDER_NAMESPACE, str(folder_path))
+
+    # returns list of (key, previous GUID, current GUID) for every GUID that
+    # changed since the table was saved
+    def verify(self):
+        res = []
+        for (namespace, name), guid in self._guids.items():
+            key = GuidTable._key(namespace, name)
+            previous = self._previous.get(key)
+            if previous is not None and previous != str(guid):
+                res.append((key, previous, str(guid)))
+        return sorted(res)
+
+    # Returns True if the table has changed and was staged to be written
+    def save(self, outputs):
+        if self.path is None:
+            return False
+        table = {}
+        for (namespace, name), guid in self._guids.items():
+            table[GuidTable._key(namespace, name)] = str(guid)
+        content = json.dumps(table, indent=1, sort_keys=True, separators=(",", ": ")) + "\n"
+        return outputs.write(self.path, content)
@@ -1,7 +1,12 @@
 import io
-import uuid
-import subprocess
+import argparse
+import fnmatch
+import sys
+import json
 from .common import *
+from .guids import GuidTable
+from .msvc_env import default_environment_provider, StubEnvironmentProvider
+from .output import OutputWriter
 from . import easy_xml
 
 try:
@@ -9,11 +14,6 @@ try:
 except ImportError:
     from io import StringIO
 
-try:
-    unicode
-except NameError:
-    unicode = str
-
 def _relpath(path1, path2):
     def _fix_drive_letter(path):
         if len(path) >= 3 and path[1] == ':' and path[2] == '/':
@@ -22,20 +22,47 @@ def _relpath(path1, path2):
             return path
     return posixpath.relpath(_fix_drive_letter(path1), _fix_drive_letter(path2))
 
+# Stands for target label in pre-rendered project fragments
+_LABEL_PLACEHOLDER = "\0"
+
+# Manifest of written files is named after the generator, not the solution, so that
+# files of renamed solution are still known (and removed as stale)
+_OUTPUTS_MANIFEST = "msvc.outputs.json"
+
 class ProjectGenerator:
 
-    def __init__(self, project_definition, solution_name, tools_version, platform_toolset, target_platform_version=None):
+    def __init__(self, project_definition, solution_name, tools_version, platform_toolset, target_platform_version=None,
+                 guid_table_path=None, env_provider=None, solution_shards=None, solution_filters=None,
+                 outputs=None):
         self.project_definition = project_definition
         self.solution_name = solution_name
         self.tool_version = tools_version
         self.platform_toolset = platform_toolset
         self.configuration_name = None
+        self._fragments = None
         self.target_platform_version = target_platform_version
 
-        if (self.target_platform_version == None):
-            env = self._get_visual_studio_env(self.tool_version, "x64")
-            self.target_platform_version = env["WINDOWSSDKVERSION"][:-1] # remove trailing \
-            print("Detected SDK version: " + self.target_platform_version)
+        # GUIDs of previous run are compared with current ones to detect unstable GUIDs
+        if guid_table_path is None:
+            guid_table_path = self.project_definition.get_absolute_build_path() + solution_name + ".guids.json"
+        self.guids = GuidTable(guid_table_path)
+
+        if outputs is None:
+            outputs = OutputWriter(self.project_definition.get_absolute_build_path() + _OUTPUTS_MANIFEST)
+        self.outputs = outputs
+
+        # None for single solution, "directory" to also write solution per top-level source directory
+        # or dictionary mapping shard name to list of label globs
+        self.solution_shards = solution_shards
+
+        # dictionary mapping filter name to {"labels": [label globs], "roots": [labels]}; each filter
+        # results in .slnf file with matching projects and projects that roots depend on
+        self.solution_filters = solution_filters
+
+        if env_provider is None:
+            env_provider = default_environment_provider(
+                self.project_definition.get_absolute_build_path() + "msvc_env.json", read_only=self.outputs.dry_run)
+        self.env_provider = env_provider
 
         path_to_lock = posixpath.normpath(posixpath.join(get_script_dir(), "../tools/directory_lock.exe"))
 
@@ -46,120 +73,48 @@ class ProjectGenerator:
         # Relative paths need to be in windows format, otherwise .. prefix won't be handled correctly
         self.directory_lock_path = path_to_lock.replace("/", "\\")
 
-    def _registry_get_value(self, key, value):
-        """Use the _winreg module to obtain the value of a registry key.
+    # Windows SDK version is only detected when first needed, which requires running vcvarsall.bat
+    def _get_target_platform_version(self):
+        if self.target_platform_version is None:
+            env = self.env_provider.get_environment(self.tool_version, "x64")
+            self.target_platform_version = env["WINDOWSSDKVERSION"][:-1] # remove trailing \
+            if isinstance(self.env_provider, StubEnvironmentProvider):
+                print("Using SDK version of stub environment: " + self.target_platform_version)
+            else:
+                print("Detected SDK version: " + self.target_platform_version)
+        return self.target_platform_version
 
-        Args:
-            key: The registry key.
-            value: The particular registry value to read.
-        Return:
-            contents of the registry key's value, or None on failure.  Throws
-            ImportError if _winreg is unavailable.
-        """
+    def generate(self):
 
-        try:
-            import _winreg
-        except ImportError:
-            import winreg as _winreg
+        targets = []
 
         try:
-            root, subkey = key.split('\\', 1)
-            assert root == 'HKLM'  # Only need HKLM for now.
-            with _winreg.OpenKey(_winreg.HKEY_LOCAL_MACHINE, subkey) as hkey:
-                return _winreg.QueryValueEx(hkey, value)[0]
-        except WindowsError:
-            return None
-
-    def _get_visual_studio_path(self, version):
-        if version == "15.0":
-            # The VC++ 2017 install location needs to be located using COM instead of
-            # the registry. For details see:
-            # https://blogs.msdn.microsoft.com/heaths/2016/09/15/changes-to-visual-studio-15-setup/
-            # For now we use a hardcoded default with an environment variable override.
-            for path in (
-                    os.environ.get('vs2017_install'),
-                    r'C:\Program Files (x86)\Microsoft Visual Studio\2017\Professional',
-                    r'C:\Program Files (x86)\Microsoft Visual Studio\2017\Community'):
-                if path and os.path.exists(path):
-                    return path
-        else:
-            keys = [r'HKLM\Software\Microsoft\VisualStudio\%s' % version,
-                    r'HKLM\Software\Wow6432Node\Microsoft\VisualStudio\%s' % version]
-            for key in keys:
-                path = self._registry_get_value(key, 'InstallDir')
-                if not path:
-                    continue
-                path = os.path.normpath(os.path.join(path, '..', '..'))
-                return path
-
-        return None
-
-    def _load_env_from_bat(self, args):
-        """Given a bat command, runs it and returns env vars set by it."""
-        args = args[:]
-        args.extend(('&&', 'set'))
-        popen = subprocess.Popen(args, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-        variables, _ = popen.communicate()
-        if popen.returncode != 0:
-            raise Exception('"%s" failed with error %d' % (args, popen.returncode))
-        if str == unicode:
-            variables = variables.decode("UTF-8")
-        return variables
-
-    def _extract_important_env(self, output_of_set):
-        """Extracts environment variables required for the toolchain to run from
-        a textual dump output by the cmd.exe 'set' command."""
-        env = {}
-        # This occasionally happens and leads to misleading SYSTEMROOT error messages
-        # if not caught here.
-
-        if output_of_set.count('=') == 0:
-            raise Exception('Invalid output_of_set. Value is:\n%s' % output_of_set)
-        for line in output_of_set.splitlines():
-            if line.startswith("*") or line.find("=") == -1:
-                continue
-            parts = line.split("=", 2)
-            if len(parts) != 2:
-                raise Exception("Invalit environment line %s" % line)
-            env[parts[0].upper()] = parts[1]
-        return env
-
-
-    def _get_visual_studio_env(self, version, platform):
-        vspath = self._get_visual_studio_path(version)
-
-        batpath = os.path.join(vspath, 'VC', 'vcvarsall.bat')
-
-        if not os.path.exists(batpath):
-            batpath = os.path.join(vspath, 'VC', 'Auxiliary', 'Build', 'vcvarsall.bat')
-
-        if not os.path.exists(batpath):
-            raise Exception('%s doesn\'t exist. Does your VS have C++ support?' % batpath)
+            for name, target in self.project_definition.targets.items():
 
-        env = self._load_env_from_bat([batpath, platform])
+                if target.toolchain != self.project_definition.default_toolchain: # ignore non default targets
+                    continue
 
-        env = self._extract_important_env(env)
-        return env
+                if (target.type == TargetType.executable or
+                    target.type == TargetType.shared_library or
+                    target.type == TargetType.static_library or
+                    target.type == TargetType.loadable_module or
+                    target.type == TargetType.source_set or
+                    target.type == TargetType.build_dir):
+                    self._write_project(target)
+                    targets.append(target)
 
-    def generate(self):
+            self._write_solution(targets)
 
-        targets = []
+            for key, previous, current in self.guids.verify():
+                print("Warning: GUID for " + key + " changed from " + previous + " to " + current)
+            self.guids.save(self.outputs)
+        except BaseException:
+            # don't leave temporary files of staged outputs behind
+            self.outputs.discard()
+            raise
 
-        for name, target in self.project_definition.targets.items():
+        self.outputs.commit()
 
-            if target.toolchain != self.project_definition.default_toolchain: # ignore non default targets
-                continue
-
-            if (target.type == TargetType.executable or
-                target.type == TargetType.shared_library or
-                target.type == TargetType.static_library or
-                target.type == TargetType.loadable_module or
-                target.type == TargetType.source_set or
-                target.type == TargetType.build_dir):
-                self._write_project(target)
-                targets.append(target)
-
-        self._write_solution(targets)
         return len(targets)
 
     def _configuration_type_for_target(self, target):
@@ -179,29 +134,80 @@ class ProjectGenerator:
         return target.get_obj_dir() + target.get_base_name() + ".vcxproj"
 
     def _project_uuid(self, target):
-        path = str(self._project_file_path(target))
-        id = uuid.uuid5(uuid.UUID('7a64fe6e-cba3-5019-90fa-640c295a343e'), path)
-        return id
+        return self.guids.project_guid(self._project_file_path(target))
 
     def _get_platform(self):
         return "x64" if self.project_definition.default_toolchain.endswith(":x64") else "Win32"
 
+    # Parts of project file that are the same for all projects are rendered only once per run
+    def _get_fragments(self):
+        if self._fragments is not None:
+            return self._fragments
+
+        def render(specification):
+            return easy_xml.render_fragment(specification, level=1, pretty=True)
+
+        def template(specification):
+            return easy_xml.XmlTemplate(specification, _LABEL_PLACEHOLDER, level=1, pretty=True)
+
+        platform = self._get_platform()
+        fragments = {}
+
+        fragments["configurations"] = render(["ItemGroup", {"Label": "ProjectConfigurations"},
+                                                ["ProjectConfiguration", { "Include":self.configuration_name+"|" + platform},
+                                                ["Configuration", self.configuration_name],
+                                                ["Platform", platform]]])
+
+        fragments["import_default_props"] = render(["Import", {"Project": "$(VCTargetsPath)\\Microsoft.Cpp.Default.props"}])
+
+        for configuration_type in ("Application", "DynamicLibrary", "StaticLibrary"):
+            fragments["configuration_" + configuration_type] = render(["PropertyGroup", {"Label": "Configuration"},
+                                                                        ["CharacterSet", "Unicode"],
+                                                                        ["ConfigurationType", configuration_type],
+                                                                        ["PlatformToolset", self.platform_toolset]])
+
+        fragments["import_props"] = render(["Import", {"Project": "$(VCTargetsPath)\\Microsoft.Cpp.props"}])
+        fragments["import_targets"] = render(["Import", {"Project": "$(VCTargetsPath)\\Microsoft.Cpp.targets"}])
+        fragments["extension_targets"] = render(["ImportGroup", {"Label": "ExtensionTargets"}])
+
+        fragments["build_target"] = template(["Target", {"Name": "Build"},
+                                                ["Exec", {"Command": self.directory_lock_path + " . ninja.exe " +  _LABEL_PLACEHOLDER,
+                                                "WorkingDirectory": "$(OutDir)"}]])
+
+        fragments["clean_target"] = template(["Target", {"Name": "Clean"},
+                                                ["Exec", {"Command": self.directory_lock_path + " . ninja.exe -t clean " +  _LABEL_PLACEHOLDER,
+                                                "WorkingDirectory": "$(OutDir)"}]])
+
+        # Outputs of all selected files are collected first so that single ninja invocation can build them in parallel
+        fragments["compile_target"] = render(["Target", {"Name": "ClCompile", "DependsOnTargets": "SelectClCompile"},
+                                                ["ItemGroup",
+                                                    # SelectCLCompile leaves precompiled header creation in, but we can skip it - ninja will take care of that
+                                                    ["_NinjaCompileOutput", {"Include": "%(ClCompile.OutputFile)",
+                                                                             "Condition": "'%(ClCompile.PrecompiledHeader)' != 'Create' and '%(ClCompile.ExcludedFromBuild)'!='true' and '%(ClCompile.CompilerIteration)' == ''"}]],
+                                                ["Exec", {"Condition": "'@(_NinjaCompileOutput)' != ''",
+                                                        "Command": self.directory_lock_path + " . ninja.exe @(_NinjaCompileOutput, ' ')",
+                                                        "WorkingDirectory": "$(OutDir)"}]])
+
+        # empty targets for build project
+        fragments["empty_targets"] = [render(["Target", {"Name": "Build"}]),
+                                      render(["Target", {"Name": "Clean"}]),
+                                      render(["Target", {"Name": "ClCompile"}])]
+
+        self._fragments = fragments
+        return fragments
+
     def _write_project(self, target):
         if self.configuration_name == None:
             debug = "_DEBUG" in target.defines or "DEBUG" in target.defines
             self.configuration_name = "Debug" if debug else "Release"
 
+        fragments = self._get_fragments()
+
         pr = ["Project", {"DefaultTargets": "Build",
                           "ToolsVersion": self.tool_version,
                           "xmlns": "http://schemas.microsoft.com/developer/msbuild/2003"}]
 
-        platform = self._get_platform()
-
-        configurations = ["ItemGroup", {"Label": "ProjectConfigurations"},
-                            ["ProjectConfiguration", { "Include":self.configuration_name+"|" + platform},
-                            ["Configuration", self.configuration_name],
-                            ["Platform", platform]]]
-        pr.append(configurations)
+        pr.append(fragments["configurations"])
 
         project_uuid = self._project_uuid(target)
 
@@ -210,20 +216,15 @@ class ProjectGenerator:
                     ["Keyword", "Win32Proj"],
                     ["RootNamespace", target.get_base_name()]]
 
-        if self.target_platform_version:
-            globals.append(["WindowsTargetPlatformVersion", self.target_platform_version])
+        target_platform_version = self._get_target_platform_version()
+        if target_platform_version:
+            globals.append(["WindowsTargetPlatformVersion", target_platform_version])
 
         pr.append(globals)
 
-        pr.append(["Import", {"Project": "$(VCTargetsPath)\\Microsoft.Cpp.Default.props"}])
-
-        configuration = ["PropertyGroup", {"Label": "Configuration"},
-                    ["CharacterSet", "Unicode"],
-                    ["ConfigurationType", self._configuration_type_for_target(target)],
-                    ["PlatformToolset", self.platform_toolset]]
-        pr.append(configuration)
-
-        pr.append(["Import", {"Project": "$(VCTargetsPath)\\Microsoft.Cpp.props"}])
+        pr.append(fragments["import_default_props"])
+        pr.append(fragments["configuration_" + self._configuration_type_for_target(target)])
+        pr.append(fragments["import_props"])
 
         other_props = ["PropertyGroup",
                         ["OutDir", self._target_relative_path(target, self.project_definition.build_dir) +"/"]]
@@ -316,7 +317,7 @@ class ProjectGenerator:
                     win_dir = dir.replace("/", "\\")
                     if not win_dir in existing_filters:
                         existing_filters.add(win_dir)
-                        id = uuid.uuid5(project_uuid, str(win_dir))
+                        id = self.guids.filter_guid(project_uuid, win_dir)
                         filter_group_filters.append(["Filter", {"Include":win_dir},
                                                         ["UniqueIdentifier", "{" + str(id) + "}"]])
 
@@ -358,47 +359,34 @@ class ProjectGenerator:
 
         pr.append(build_group)
 
-        pr.append(["Import", {"Project": "$(VCTargetsPath)\\Microsoft.Cpp.targets"}])
-        pr.append(["ImportGroup", {"Label": "ExtensionTargets"}])
+        pr.append(fragments["import_targets"])
+        pr.append(fragments["extension_targets"])
 
         # Only add custom build rules for regular targets, ignore build target
         # which is not something that ninja knows about
         if target.type != TargetType.build_dir:
-
             build_target_name = target.name[2:]
-            build_target = ["Target", {"Name": "Build"},
-                            ["Exec", {"Command": self.directory_lock_path + " . ninja.exe " +  build_target_name,
-                            "WorkingDirectory": "$(OutDir)"}]]
-            pr.append(build_target)
-
-            clean_target = ["Target", {"Name": "Clean"},
-                            ["Exec", {"Command": self.directory_lock_path + " . ninja.exe -t clean " +  build_target_name,
-                            "WorkingDirectory": "$(OutDir)"}]]
-            pr.append(clean_target)
-
-            compile_target = ["Target", {"Name": "ClCompile", "DependsOnTargets": "SelectClCompile"},
-                            # SelectCLCompile leaves precompiled header creation in, but we can skip it - ninja will take care of that
-                            ["Exec", {"Condition": "'%(ClCompile.PrecompiledHeader)' != 'Create' and '%(ClCompile.ExcludedFromBuild)'!='true' and '%(ClCompile.CompilerIteration)' == '' and @(ClCompile) != ''",
-                                    "Command": self.directory_lock_path + " . ninja.exe %(ClCompile.OutputFile)",
-                                    "WorkingDirectory": "$(OutDir)"}]]
-            pr.append(compile_target)
-
+            pr.append(fragments["build_target"].substitute(build_target_name))
+            pr.append(fragments["clean_target"].substitute(build_target_name))
+            pr.append(fragments["compile_target"])
         else: # empty targets for build project
-            pr.append(["Target", {"Name": "Build"}])
-            pr.append(["Target", {"Name": "Clean"}])
-            pr.append(["Target", {"Name": "ClCompile"}])
+            pr.extend(fragments["empty_targets"])
 
         project_file_path = self.project_definition.get_absolute_path(self._project_file_path(target))
-        if not os.path.exists(posixpath.dirname(project_file_path)):
-            os.mkdir(posixpath.dirname(project_file_path))
 
-        easy_xml.write_xml_if_changed(pr, project_file_path, pretty=True)
+        self._write_xml(project_file_path, pr)
 
         # filters
         filters_project = ["Project", {"ToolsVersion": "4.0",
                                        "xmlns": "http://schemas.microsoft.com/developer/msbuild/2003"},
                            filter_group_files, filter_group_filters]
-        easy_xml.write_xml_if_changed(filters_project, project_file_path + ".filters", pretty=True)
+        self._write_xml(project_file_path + ".filters", filters_project)
+
+    # Streams XML document to output file, without rendering it to string first
+    def _write_xml(self, path, specification):
+        output = self.outputs.open(path)
+        easy_xml.write_xml(specification, output, pretty=True)
+        output.close()
 
 
     def _write_solution(self, targets):
@@ -436,13 +424,99 @@ class ProjectGenerator:
             source_dir = source_dir[2:]
             return source_dir
 
+        # Everything solution needs to know about project is computed once and shared by all
+        # solution files (full solution and shards)
+        projects = []
+        for target in targets:
+            projects.append(_SolutionProject(target,
+                                             self.project_definition.get_relative_path(self._project_file_path(target)),
+                                             str(self._project_uuid(target)),
+                                             project_solution_folder_path(target)))
+
+        build_path = self.project_definition.get_absolute_build_path()
+        self.outputs.write(build_path + self.solution_name + ".sln", self._render_solution(projects), late=True)
+
+        if self.solution_shards is not None:
+            for shard_name, shard_projects in sorted(self._shard_projects(projects).items()):
+                shard_file = build_path + self.solution_name + "_" + shard_name + ".sln"
+                self.outputs.write(shard_file, self._render_solution(shard_projects), late=True)
+
+        if self.solution_filters is not None:
+            for filter_name, definition in sorted(self.solution_filters.items()):
+                filter_file = build_path + self.solution_name + "_" + filter_name + ".slnf"
+                self.outputs.write(filter_file, self._render_solution_filter(projects, definition), late=True)
+
+    # Returns names of given targets and all targets they depend on, directly or indirectly
+    def _dependency_closure(self, roots):
+        all_targets = self.project_definition.targets
+        res = set()
+        pending = [root for root in roots if root in all_targets]
+        while pending:
+            name = pending.pop()
+            if name in res:
+                continue
+            res.add(name)
+            for dep in all_targets[name].deps:
+                if dep not in res and dep in all_targets:
+                    pending.append(dep)
+        return res
+
+    def _render_solution_filter(self, projects, definition):
+        names = self._dependency_closure(definition.get("roots", []))
+        patterns = definition.get("labels", [])
+
+        project_paths = []
+        for project in projects:
+            target = project.target
+            if (target.type == TargetType.build_dir or
+                target.name in names or
+                any(fnmatch.fnmatchcase(target.name, pattern) for pattern in patterns)):
+                project_paths.append(project.relative_path.replace("/", "\\"))
+
+        content = {"solution": {"path": self.solution_name + ".sln",
+                                "projects": sorted(project_paths)}}
+        return json.dumps(content, indent=2, sort_keys=True, separators=(",", ": ")) + "\n"
+
+    # Splits projects into shards in single pass; build dir project is part of every shard
+    def _shard_projects(self, projects):
+        shards = {}
+        build_projects = []
+        for project in projects:
+            target = project.target
+            if target.type == TargetType.build_dir:
+                build_projects.append(project)
+                continue
+
+            if self.solution_shards == "directory":
+                top_level_dir = target.get_source_dir()[2:].split("/")[0]
+                names = [top_level_dir if top_level_dir else "root"]
+            else:
+                names = []
+                for name, patterns in self.solution_shards.items():
+                    for pattern in patterns:
+                        if fnmatch.fnmatchcase(target.name, pattern):
+                            names.append(name)
+                            break
+
+            for name in names:
+                shards.setdefault(name, []).append(project)
+
+        for shard_projects in shards.values():
+            shard_projects.extend(build_projects)
+
+        return shards
+
+    def _render_solution(self, projects):
+
+        guids = self.guids
+
         class SolutionFolder:
 
             def __init__(self, name, path, parent):
                 self.name = name
                 self.path = path
                 self.parent = parent
-                self.uuid = uuid.uuid5(uuid.UUID('53acf19b-cba3-5019-90fa-640c295a343e'), str(self.path))
+                self.uuid = guids.solution_folder_guid(self.path)
 
         output = StringIO()
         output.write("Microsoft Visual Studio Solution File, Format Version 12.00\n")
@@ -451,8 +525,8 @@ class ProjectGenerator:
         # path to folder
         solution_folders = {}
 
-        # target to solution folder
-        target_to_folder = {}
+        # project to solution folder
+        project_to_folder = []
 
         def get_solution_folder(solution_folder_path):
             if len(solution_folder_path) == 0:
@@ -465,16 +539,14 @@ class ProjectGenerator:
                 solution_folders[solution_folder_path] = res
                 return res
 
-        for target in targets:
+        for project in projects:
 
-            solution_folder_path = project_solution_folder_path(target)
-            solution_folder = get_solution_folder(solution_folder_path)
+            solution_folder = get_solution_folder(project.folder_path)
             if solution_folder is not None:
-                target_to_folder[target] = solution_folder
+                project_to_folder.append((project, solution_folder))
 
-            output.write('Project("{8BC9CEB8-8B4A-11D0-8D11-00A0C91BC942}") = "' + target.get_base_name() + '", "' +
-                          self.project_definition.get_relative_path(self._project_file_path(target)) + '", "{' +
-                          str(self._project_uuid(target)) + '}"\n');
+            output.write('Project("{8BC9CEB8-8B4A-11D0-8D11-00A0C91BC942}") = "' + project.target.get_base_name() + '", "' +
+                          project.relative_path + '", "{' + project.uuid + '}"\n');
             # for now ignore project dependencies, it doesn't seem to help much given that ninja build takes care of that
             # output.write("\tProjectSection(ProjectDependencies) = postProject\n");
             # for t in targets:
@@ -500,8 +572,8 @@ class ProjectGenerator:
         output.write("\tEndGlobalSection\n")
 
         output.write("\tGlobalSection(ProjectConfigurationPlatforms) = postSolution\n")
-        for target in targets:
-            prefix = "{" + str(self._project_uuid(target)) + "}." + config
+        for project in projects:
+            prefix = "{" + project.uuid + "}." + config
             output.write("\t\t" + prefix + ".ActiveCFG = " + config + "\n")
             output.write("\t\t" + prefix + ".Build.0 = " + config + "\n")
         output.write("\tEndGlobalSection\n")
@@ -514,13 +586,86 @@ class ProjectGenerator:
         for path, folder in solution_folders.items():
             if not folder.parent is None:
                 output.write("\t\t{" + str(folder.uuid) + "} = {" + str(folder.parent.uuid) + "}\n")
-        for target, folder in target_to_folder.items():
-            output.write("\t\t{" + str(self._project_uuid(target)) + "} = {" + str(folder.uuid) + "}\n")
+        for project, folder in project_to_folder:
+            output.write("\t\t{" + project.uuid + "} = {" + str(folder.uuid) + "}\n")
         output.write("\tEndGlobalSection\n")
 
         output.write("EndGlobal\n")
 
-        solution_file = self.project_definition.get_absolute_build_path() + self.solution_name + ".sln"
-        overwrite_file_if_different(solution_file, output.getvalue())
-
+        res = output.getvalue()
         output.close()
+        return res
+
+# Solution entry for single project
+class _SolutionProject:
+    def __init__(self, target, relative_path, uuid, folder_path):
+        self.target = target
+        self.relative_path = relative_path
+        self.uuid = uuid
+        self.folder_path = folder_path
+
+def run(tools_version, platform_toolset):
+
+    parser = argparse.ArgumentParser(description="Generates Visual Studio solution from GN JSON project file")
+    parser.add_argument("json_file", help="path to JSON file generated by gn")
+    parser.add_argument("solution_name", nargs="?", default="Solution", help="name of the solution file")
+    parser.add_argument("--shard-by-directory", action="store_true",
+                        help="also write one solution per top-level source directory")
+    parser.add_argument("--shard-groups", metavar="FILE",
+                        help="also write one solution per label group; FILE is JSON object mapping "
+                             "group name to list of label globs")
+    parser.add_argument("--solution-filters", metavar="FILE",
+                        help="also write solution filter (.slnf) files; FILE is JSON object mapping filter name "
+                             "to {\"labels\": [label globs], \"roots\": [labels whose dependencies are included]}")
+    parser.add_argument("--keep-stale", action="store_true",
+                        help="only report files generated by previous run that are no longer generated")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="only report files that would be created, changed or deleted")
+    parser.add_argument("--check", action="store_true",
+                        help="don't write anything, exit with non-zero status if generated files are out of date")
+    parser.add_argument("--stub-environment", nargs="?", const="10.0.17134.0", metavar="SDK_VERSION",
+                        help="don't query installed Visual Studio, use fixed Windows SDK version "
+                             "(default 10.0.17134.0); required outside of Windows")
+    args = parser.parse_args()
+
+    solution_shards = None
+    if args.shard_groups:
+        with open(args.shard_groups, "r") as f:
+            solution_shards = json.load(f)
+    elif args.shard_by_directory:
+        solution_shards = "directory"
+
+    solution_filters = None
+    if args.solution_filters:
+        with open(args.solution_filters, "r") as f:
+            solution_filters = json.load(f)
+
+    with open(args.json_file, "r") as json_file:
+        v = json_file.read()
+        json_file.close()
+        js = json.loads(v)
+
+        project = Project(js)
+
+        outputs = OutputWriter(project.get_absolute_build_path() + _OUTPUTS_MANIFEST,
+                               remove_stale=not args.keep_stale,
+                               dry_run=args.dry_run or args.check)
+
+        env_provider = None
+        if args.stub_environment:
+            env_provider = StubEnvironmentProvider(args.stub_environment)
+
+        generator = ProjectGenerator(project, args.solution_name,
+                                     tools_version=tools_version,
+                                     platform_toolset=platform_toolset,
+                                     solution_shards=solution_shards,
+                                     solution_filters=solution_filters,
+                                     env_provider=env_provider,
+                                     outputs=outputs)
+        count = generator.generate()
+
+        print("Done generating " + str(count) + " project file(s)")
+
+        if args.check and outputs.has_changes():
+            print("Generated files are out of date")
+            sys.exit(1)
@@ -0,0 +1,187 @@
+#
+# Visual Studio environment detection
+#
+
+import json
+import os
+import subprocess
+import sys
+
+try:
+    unicode
+except NameError:
+    unicode = str
+
+class EnvironmentProvider:
+    """Provides environment variables set up by Visual Studio (vcvarsall.bat)."""
+
+    def get_environment(self, version, platform):
+        raise NotImplementedError()
+
+    # Returns string identifying environment returned for given version and platform,
+    # or None if the environment can not be cached
+    def get_cache_key(self, version, platform):
+        return None
+
+class VcvarsEnvironmentProvider(EnvironmentProvider):
+    """Runs vcvarsall.bat of installed Visual Studio and captures the environment."""
+
+    def _registry_get_value(self, key, value):
+        """Use the _winreg module to obtain the value of a registry key.
+
+        Args:
+            key: The registry key.
+            value: The particular registry value to read.
+        Return:
+            contents of the registry key's value, or None on failure.  Throws
+            ImportError if _winreg is unavailable.
+        """
+
+        try:
+            import _winreg
+        except ImportError:
+            import winreg as _winreg
+
+        try:
+            root, subkey = key.split('\\', 1)
+            assert root == 'HKLM'  # Only need HKLM for now.
+            with _winreg.OpenKey(_winreg.HKEY_LOCAL_MACHINE, subkey) as hkey:
+                return _winreg.QueryValueEx(hkey, value)[0]
+        except WindowsError:
+            return None
+
+    def _get_visual_studio_path(self, version):
+        if version == "15.0":
+            # The VC++ 2017 install location needs to be located using COM instead of
+            # the registry. For details see:
+            # https://blogs.msdn.microsoft.com/heaths/2016/09/15/changes-to-visual-studio-15-setup/
+            # For now we use a hardcoded default with an environment variable override.
+            for path in (
+                    os.environ.get('vs2017_install'),
+                    r'C:\Program Files (x86)\Microsoft Visual Studio\2017\Professional',
+                    r'C:\Program Files (x86)\Microsoft Visual Studio\2017\Community'):
+                if path and os.path.exists(path):
+                    return path
+        else:
+            keys = [r'HKLM\Software\Microsoft\VisualStudio\%s' % version,
+                    r'HKLM\Software\Wow6432Node\Microsoft\VisualStudio\%s' % version]
+            for key in keys:
+                path = self._registry_get_value(key, 'InstallDir')
+                if not path:
+                    continue
+                path = os.path.normpath(os.path.join(path, '..', '..'))
+                return path
+
+        return None
+
+    def _get_bat_path(self, version):
+        if sys.platform != "win32":
+            raise Exception('Visual Studio environment can only be detected on Windows')
+
+        vspath = self._get_visual_studio_path(version)
+        if vspath is None:
+            raise Exception('Visual Studio %s installation not found' % version)
+
+        batpath = os.path.join(vspath, 'VC', 'vcvarsall.bat')
+
+        if not os.path.exists(batpath):
+            batpath = os.path.join(vspath, 'VC', 'Auxiliary', 'Build', 'vcvarsall.bat')
+
+        if not os.path.exists(batpath):
+            raise Exception('%s doesn\'t exist. Does your VS have C++ support?' % batpath)
+
+        return batpath
+
+    def _load_env_from_bat(self, args):
+        """Given a bat command, runs it and returns env vars set by it."""
+        args = args[:]
+        args.extend(('&&', 'set'))
+        popen = subprocess.Popen(args, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        variables, _ = popen.communicate()
+        if popen.returncode != 0:
+            raise Exception('"%s" failed with error %d' % (args, popen.returncode))
+        if str == unicode:
+            variables = variables.decode("UTF-8")
+        return variables
+
+    def _extract_important_env(self, output_of_set):
+        """Extracts environment variables required for the toolchain to run from
+        a textual dump output by the cmd.exe 'set' command."""
+        env = {}
+        # This occasionally happens and leads to misleading SYSTEMROOT error messages
+        # if not caught here.
+
+        if output_of_set.count('=') == 0:
+            raise Exception('Invalid output_of_set. Value is:\n%s' % output_of_set)
+        for line in output_of_set.splitlines():
+            if line.startswith("*") or line.find("=") == -1:
+                continue
+            parts = line.split("=", 2)
+            if len(parts) != 2:
+                raise Exception("Invalit environment line %s" % line)
+            env[parts[0].upper()] = parts[1]
+        return env
+
+    def get_environment(self, version, platform):
+        env = self._load_env_from_bat([self._get_bat_path(version), platform])
+        return self._extract_important_env(env)
+
+    def get_cache_key(self, version, platform):
+        batpath = self._get_bat_path(version)
+        return "|".join([version, platform, os.path.dirname(batpath),
+                         str(os.path.getmtime(batpath))])
+
+class StubEnvironmentProvider(EnvironmentProvider):
+    """Returns fixed environment; allows running the generator without Visual Studio.
+
+    Never used implicitly, it has to be passed to ProjectGenerator (--stub-environment).
+    """
+
+    def __init__(self, sdk_version="10.0.17134.0"):
+        self.sdk_version = sdk_version
+
+    def get_environment(self, version, platform):
+        return {"WINDOWSSDKVERSION": self.sdk_version + "\\"}
+
+class CachedEnvironmentProvider(EnvironmentProvider):
+    """Caches environment of another provider in a JSON file.
+
+    Entries are keyed by the provider's cache key (for vcvarsall.bat this is
+    VS version, platform, install path and modification time of the bat file),
+    so the cache invalidates itself when Visual Studio is updated. With
+    read_only the cache is used but never written (i.e. in dry run).
+    """
+
+    def __init__(self, provider, cache_path, read_only=False):
+        self.provider = provider
+        self.cache_path = cache_path
+        self.read_only = read_only
+
+    def _load(self):
+        try:
+            with open(self.cache_path, "r") as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def get_environment(self, version, platform):
+        key = self.provider.get_cache_key(version, platform)
+        if key is None:
+            return self.provider.get_environment(version, platform)
+
+        cache = self._load()
+        env = cache.get(key)
+        if env is None:
+            env = self.provider.get_environment(version, platform)
+            if not self.read_only:
+                cache[key] = env
+                with open(self.cache_path, "w") as f:
+                    json.dump(cache, f, indent=1, sort_keys=True)
+        return env
+
+    def get_cache_key(self, version, platform):
+        return self.provider.get_cache_key(version, platform)
+
+# Returns provider used when none is given explicitly
+def default_environment_provider(cache_path, read_only=False):
+    return CachedEnvironmentProvider(VcvarsEnvironmentProvider(), cache_path, read_only)
@@ -0,0 +1,413 @@
+#
+# Writing of generated files
+#
+
+import hashlib
+import json
+import os
+import time
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+try:
+    unicode
+except NameError:
+    unicode = str
+
+def _encode(content):
+    if isinstance(content, unicode):
+        content = content.encode("utf-8")
+    return content
+
+def _digest(content):
+    return hashlib.sha1(_encode(content)).hexdigest()
+
+class OutputManifest:
+    """Size, modification time and content digest of every file written by generator.
+
+    As long as file on disk still has the size and modification time recorded
+    when it was written, its content is known to match the recorded digest and
+    the file doesn't need to be read to find out whether it has changed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self._modified = False
+
+        try:
+            with open(path, "r") as f:
+                self.entries = json.load(f)
+        except (IOError, OSError, ValueError):
+            self.entries = {}
+
+    # Returns digest of file content if file wasn't modified since it was recorded, None otherwise
+    def known_digest(self, path):
+        entry = self.entries.get(path)
+        if entry is None:
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if st.st_size != entry[0] or st.st_mtime != entry[1]:
+            return None
+        return entry[2]
+
+    def remove(self, path):
+        if path in self.entries:
+            del self.entries[path]
+            self._modified = True
+
+    def record(self, path, digest):
+        st = os.stat(path)
+        entry = [st.st_size, st.st_mtime, digest]
+        if self.entries.get(path) != entry:
+            self.entries[path] = entry
+            self._modified = True
+
+    # Sets entries recorded by manifest in another process
+    def update(self, entries):
+        for path, entry in entries.items():
+            if self.entries.get(path) != entry:
+                self.entries[path] = entry
+                self._modified = True
+
+    def save(self):
+        if not self._modified:
+            return
+        with open(self.path, "w") as f:
+            json.dump(self.entries, f, indent=0, sort_keys=True)
+            f.write("\n")
+        self._modified = False
+
+def _replace(source, destination):
+    try:
+        os.replace(source, destination)
+    except AttributeError: # python 2.7
+        if os.name == "nt" and os.path.exists(destination):
+            os.remove(destination)
+        os.rename(source, destination)
+
+class OutputStream:
+    """Streams content of single file written through OutputWriter.open().
+
+    Content is encoded to UTF-8 in chunks, which are compared with the existing
+    file as they are written, so that complete content is never held in memory.
+    Nothing is written to disk until the first difference; the temporary file is
+    then started with the matching prefix copied from the existing file.
+
+    When the manifest knows the digest of the existing file, it is not read at
+    all: encoded chunks are only held until close() compares the digests. Content
+    larger than _hold_limit is compared with the existing file after all.
+
+    Written text is buffered until flush() finds enough of it, so writers producing
+    many small strings should call flush() periodically.
+
+    Line endings are translated as if the file was written in text mode, so that
+    files are the same as written by OutputWriter.write().
+    """
+
+    _chunk_size = 65536
+    _hold_limit = 4 * 1024 * 1024
+
+    def __init__(self, writer, path, late):
+        self.writer = writer
+        self.path = path
+        self.late = late
+        self.size = 0
+        self.digest = None
+        self._buffer = StringIO()
+        self._hash = hashlib.sha1()
+        self._existing = None
+        self._temporary = None
+        self._diverged = False
+        self._known_digest = writer.manifest.known_digest(path)
+        self._held = None # encoded chunks, while existing file is known by digest
+
+        if self._known_digest is not None:
+            self._held = []
+        elif os.path.exists(path):
+            self._existing = open(path, "rb")
+        else:
+            self._diverge()
+
+        self.write = self._buffer.write
+
+    def flush(self):
+        if self._buffer.tell() >= OutputStream._chunk_size:
+            self._flush()
+
+    def _flush(self):
+        chunk = _encode(self._buffer.getvalue())
+        self._buffer.seek(0)
+        self._buffer.truncate(0)
+        if not chunk:
+            return
+
+        self._hash.update(chunk)
+        if os.linesep != "\n":
+            chunk = chunk.replace(b"\n", os.linesep.encode("ascii"))
+        if self._held is None:
+            self._write_chunk(chunk)
+            return
+
+        self._held.append(chunk)
+        self.size += len(chunk)
+        if self.size > OutputStream._hold_limit:
+            # too large to hold, compare with existing file instead
+            self._existing = open(self.path, "rb")
+            self._write_held()
+
+    # Writes held chunks as if they were just flushed
+    def _write_held(self):
+        held = self._held
+        self._held = None
+        self.size = 0
+        for chunk in held:
+            self._write_chunk(chunk)
+
+    def _write_chunk(self, chunk):
+        if not self._diverged and self._existing.read(len(chunk)) != chunk:
+            self._diverge()
+        if self._temporary is not None:
+            self._temporary.write(chunk)
+        self.size += len(chunk)
+
+    # Called on first difference; copies matching prefix of existing file to temporary file
+    def _diverge(self):
+        self._diverged = True
+        if self.writer.dry_run:
+            return
+
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._temporary = open(self.path + ".gn-tmp", "wb")
+        if self._existing is not None:
+            self._existing.seek(0)
+            remaining = self.size
+            while remaining > 0:
+                data = self._existing.read(min(remaining, OutputStream._chunk_size))
+                self._temporary.write(data)
+                remaining -= len(data)
+
+    # Closes stream after failure, removing temporary file
+    def discard(self):
+        if self._existing is not None:
+            self._existing.close()
+        if self._temporary is not None:
+            self._temporary.close()
+            os.remove(self.path + ".gn-tmp")
+            self._temporary = None
+
+    # Returns True if the file has changed and was staged to be written
+    def close(self):
+        self._flush()
+        if self._held is not None:
+            if self._hash.hexdigest() != self._known_digest:
+                self._diverge()
+                self._write_held()
+            self._held = None
+        elif not self._diverged and self._existing.read(1) != b"":
+            self._diverge() # existing file is longer
+        if self._existing is not None:
+            self._existing.close()
+        if self._temporary is not None:
+            self._temporary.close()
+        self.digest = self._hash.hexdigest()
+        self.writer._stream_closed(self, self._diverged)
+        return self._diverged
+
+class OutputWriter:
+    """Writes generated files, touching them only if their content has changed.
+
+    Changed files are first staged to temporary files next to their destination
+    and only replaced (atomically) in commit(), so that IDEs watching the files
+    see all changes at once instead of reloading projects one by one during
+    generation. Files staged with late=True (solutions, workspaces) are
+    replaced after all other files.
+
+    Files recorded in manifest by previous run that were not written during
+    this run are stale; commit() deletes them, or only reports them when
+    remove_stale is False.
+
+    With dry_run nothing is written at all; commit() only reports files that
+    would be created, changed or deleted.
+
+    When generation fails, discard() removes the temporary files of everything
+    staged so far.
+    """
+
+    def __init__(self, manifest_path, remove_stale=True, dry_run=False):
+        self.manifest = OutputManifest(manifest_path)
+        self.remove_stale = remove_stale
+        self.dry_run = dry_run
+        self._staged = [] # (path, temporary path, digest, late)
+        self._produced = set()
+        self._changes = [] # (path, previous size or None, new size) in dry run
+        self._states = [] # (path, content) written after commit
+        self._streams = set() # open streams
+
+    # Returns True if the file has changed and was staged to be written
+    def write(self, path, content, late=False):
+        self._produced.add(path)
+        digest = _digest(content)
+
+        known_digest = self.manifest.known_digest(path)
+        if known_digest == digest:
+            return False
+
+        changed = True
+        if known_digest is None and os.path.exists(path):
+            # modified outside of generator (or not recorded yet), compare content
+            with open(path) as existing_file:
+                changed = existing_file.read() != content
+
+        if not changed:
+            self.manifest.record(path, digest)
+            return False
+
+        if self.dry_run:
+            previous_size = os.path.getsize(path) if os.path.exists(path) else None
+            self._changes.append((path, previous_size, len(_encode(content))))
+            return True
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        temporary_path = path + ".gn-tmp"
+        with open(temporary_path, "w") as f:
+            f.write(content)
+        self._staged.append((path, temporary_path, digest, late))
+        return True
+
+    # Returns OutputStream for writing file in chunks; closing the stream has same
+    # result as write() with complete content
+    def open(self, path, late=False):
+        self._produced.add(path)
+        stream = OutputStream(self, path, late)
+        self._streams.add(stream)
+        return stream
+
+    # Writes generator state (not a generated file, not recorded in manifest) after
+    # successful commit, so that it always describes committed files
+    def write_state(self, path, content):
+        self._states.append((path, content))
+
+    def _stream_closed(self, stream, changed):
+        self._streams.discard(stream)
+        if not changed:
+            self.manifest.record(stream.path, stream.digest)
+        elif self.dry_run:
+            previous_size = os.path.getsize(stream.path) if os.path.exists(stream.path) else None
+            self._changes.append((stream.path, previous_size, stream.size))
+        else:
+            self._staged.append((stream.path, stream.path + ".gn-tmp", stream.digest, stream.late))
+
+    # Returns state of files written through this writer; writer in worker process
+    # returns it so that the main writer can merge() and commit it
+    def get_results(self):
+        records = dict((path, self.manifest.entries[path]) for path in self._produced
+                       if path in self.manifest.entries)
+        return self._staged, self._produced, self._changes, self._states, records
+
+    def merge(self, results):
+        staged, produced, changes, states, records = results
+        self._staged.extend(staged)
+        self._produced.update(produced)
+        self._changes.extend(changes)
+        self._states.extend(states)
+        self.manifest.update(records)
+
+    # Removes temporary files of staged files and open streams; called when generation fails
+    def discard(self):
+        for stream in list(self._streams):
+            stream.discard()
+        self._streams.clear()
+        for path, temporary_path, digest, late in self._staged:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+        self._staged = []
+        self._states = []
+
+    # Replaces all staged files and saves manifest; returns number of replaced files
+    # and duration of the commit window (time between first and last replaced file)
+    def commit(self):
+        if self.dry_run:
+            self._report_changes()
+            return 0, 0.0
+
+        staged = [s for s in self._staged if not s[3]] + [s for s in self._staged if s[3]]
+        self._staged = []
+
+        start = time.time()
+        for path, temporary_path, digest, late in staged:
+            _replace(temporary_path, path)
+        window = time.time() - start
+
+        for path, temporary_path, digest, late in staged:
+            self.manifest.record(path, digest)
+
+        for path, content in self._states:
+            with open(path, "w") as f:
+                f.write(content)
+        self._states = []
+
+        for path in sorted(self.stale_files()):
+            if self.remove_stale:
+                print("Removing stale file " + path)
+                self._remove_file(path)
+                self.manifest.remove(path)
+            else:
+                print("Stale file " + path)
+
+        self.manifest.save()
+
+        if len(staged) > 0:
+            print("Committed " + str(len(staged)) + " changed file(s) in %.1f ms" % (window * 1000))
+        return len(staged), window
+
+    # Returns True if any file would be created, changed or deleted by commit()
+    def has_changes(self):
+        if self._staged or self._changes:
+            return True
+        if not self.remove_stale:
+            return False
+        return any(os.path.exists(path) for path in self.stale_files())
+
+    def _report_changes(self):
+        created = changed = deleted = 0
+        for path, previous_size, size in self._changes:
+            if previous_size is None:
+                created += 1
+                print("Would create %s (+%d bytes)" % (path, size))
+            else:
+                changed += 1
+                print("Would change %s (%+d bytes)" % (path, size - previous_size))
+        if self.remove_stale:
+            for path in sorted(self.stale_files()):
+                if os.path.exists(path):
+                    deleted += 1
+                    print("Would delete %s (-%d bytes)" % (path, os.path.getsize(path)))
+        print("%d file(s) would be created, %d changed, %d deleted" % (created, changed, deleted))
+
+    # Returns files written by previous run but not by this one
+    def stale_files(self):
+        return set(self.manifest.entries.keys()) - self._produced
+
+    # Removes file and directories that became empty, up to the directory containing manifest
+    def _remove_file(self, path):
+        if os.path.exists(path):
+            os.remove(path)
+
+        root = os.path.dirname(os.path.abspath(self.manifest.path))
+        directory = os.path.dirname(os.path.abspath(path))
+        while directory.startswith(root + os.sep) and os.path.isdir(directory) and not os.listdir(directory):
+            os.rmdir(directory)
+            directory = os.path.dirname(directory)
@@ -2,12 +2,16 @@
 # Xcode project model
 #
 
+import binascii
+import bisect
 import hashlib
+import json
 import struct
 import collections
 import re
 import posixpath
 from pprint import pprint
+from . import plist
 
 # 2.7/3.5 compatibility
 
@@ -21,22 +25,130 @@ try:
 except NameError:
     xrange = range
 
-#
-class PBXObject:
+# python 2.7 does not have casefold, we'll use lower() instead
+try:
+    "".casefold()
+    _casefold = lambda x : x.casefold()
+except AttributeError:
+    _casefold = lambda x : x.lower()
+
+# Precomputed indentation strings for serializers
+_indentation = ["\t" * i for i in xrange(32)]
+
+# Objects of previously written project file, keyed by ID, together with their
+# fingerprints (see PBXObject.get_fingerprint) recorded when the file was written.
+# Objects are only located when the map is created; get_reusable_text() returns
+# previous text of objects that would be written exactly the same again.
+class PBXObjectMap:
+
+    _object_start = re.compile(r'\n\t\t([0-9A-F]{24}) ')
+
+    def __init__(self, text, fingerprints = None):
+        self._text = text
+        self._fingerprints = fingerprints or {}
+        self._spans = {} # ID -> (start, end); end is start of next object
+
+        starts = [(m.start() + 1, m.group(1)) for m in PBXObjectMap._object_start.finditer(text)]
+        starts.append((len(text), None))
+        for i in xrange(len(starts) - 1):
+            start, id = starts[i]
+            if id in self._spans:
+                self._spans[id] = None # duplicate, don't trust either
+            else:
+                self._spans[id] = (start, starts[i + 1][0])
+
+    def __len__(self):
+        return len(self._spans)
+
+    # Returns previous text of object (complete line(s) in objects section) if the
+    # object is unchanged, None otherwise; fingerprint must be given for objects
+    # not determined by ID
+    def get_reusable_text(self, o, fingerprint = None):
+        span = self._spans.get(o.get_id())
+        if span is None:
+            return None
+
+        start, end = span
+        text = self._text[start:end]
+        if not text.endswith(";\n"):
+            # last object in section
+            section_end = text.find("\n/* End ")
+            if section_end == -1:
+                return None
+            text = text[:section_end + 1]
+            if not text.endswith(";\n"):
+                return None
+
+        if o._single_line:
+            # raw new line in single line object, can't tell where the object ends
+            if text.find("\n") != len(text) - 1:
+                return None
+
+        if not o.is_determined_by_id():
+            previous_fingerprint = self._fingerprints.get(o.get_id())
+            if previous_fingerprint is not None:
+                if previous_fingerprint != fingerprint:
+                    return None
+            elif not self._matches_text(o, text[text.find(" = ") + 3 : -2]):
+                return None
+
+        return text
+
+    # Compares object with its previous text when fingerprint wasn't recorded
+    @staticmethod
+    def _matches_text(o, text):
+        if "\n;" in text or "\n," in text:
+            # unquoted string with trailing new line (see _unquoted); parsed value
+            # would not tell it apart from string without it
+            return False
+        try:
+            previous = plist.parse(text)
+        except plist.PlistError:
+            return False
+        return isinstance(previous, dict) and o.matches_previous(previous)
+
+# Bounded memo of encoded strings keyed by (value, single_line); the same paths,
+# build setting names and values recur many times in a project
+_encoded_strings = {}
+_encoded_strings_limit = 100000
+_encoded_strings_hits = 0
+_encoded_strings_misses = 0
+
+# Returns (hits, misses) of encoded string memo since last reset
+def get_encoded_string_stats():
+    return _encoded_strings_hits, _encoded_strings_misses
+
+def reset_encoded_string_stats():
+    global _encoded_strings_hits, _encoded_strings_misses
+    _encoded_strings_hits = 0
+    _encoded_strings_misses = 0
+
+# Projects can contain millions of objects, so PBXObject and all its subclasses
+# use __slots__; property dictionary is only created when first property is set
+# and hashables are released once the ID digest is computed.
+class PBXObject(object):
+
+    __slots__ = ("_properties", "_hash_parent", "_id", "_id_digest", "_hashables", "_reference")
+
+    _single_line = False
 
     # hash_parent optionally specifies object that contributes hashable to this PBXObject
     def __init__(self, hash_parent = None):
-        self._single_line = False
-        self._properties = {}
+        self._properties = None
         self._hash_parent = hash_parent
         self._id = None
         self._id_digest = None
         self._hashables = None
+        self._reference = None
 
     def set_property(self, key, value):
+        if self._properties is None:
+            self._properties = {}
         self._properties[key] = value
 
     def get_property(self, key):
+        if self._properties is None:
+            raise KeyError(key)
         return self._properties[key]
 
     def get_name(self):
@@ -74,55 +186,135 @@ class PBXObject:
     # returns complete SHA digest from ID (160bits)
     def get_id_digest(self):
 
-        def compute_id_digest(self):
-            sha = hashlib.sha1().copy()
-            hashables = self.get_hashables()
-            for hashable in hashables:
-                data = hashable
-                if unicode == str and isinstance(data, unicode):
-                    data = data.encode("utf-8")
-                sha.update(struct.pack('>i', len(data)))
-                sha.update(data)
-            return sha.digest()
-
         if self._id_digest is None:
-            self._id_digest = compute_id_digest(self)
+            # every hashable is prefixed with its length (32 bit big endian)
+            parts = []
+            for hashable in self.get_hashables():
+                if isinstance(hashable, unicode):
+                    hashable = hashable.encode("utf-8")
+                parts.append(struct.pack('>i', len(hashable)))
+                parts.append(hashable)
+            self._id_digest = hashlib.sha1(b"".join(parts)).digest()
+            # ID is fixed now, hashables are only needed again for legacy PBXBuildFile IDs
+            # and get_hashables() can recompute them
+            self._hashables = None
 
         return self._id_digest
 
     def get_id(self):
 
-        def compute_id(self):
-            digest = self.get_id_digest()
-            digest_size = len(digest)
-
+        if self._id is None:
             # Xcode IDs are only 96 bits (24 hex characters), but a SHA-1 digest is
             # is 160 bits.  Instead of throwing out 64 bits of the digest, xor them
-            # into the portion that gets used.
-            assert digest_size % 4 == 0
-            digest_int_count = int(digest_size / 4)
-            digest_ints = struct.unpack('>' + 'I' * digest_int_count, digest)
-            id_ints = [0, 0, 0]
-            for index in xrange(0, digest_int_count):
-                id_ints[index % 3] ^= digest_ints[index]
-            return '%08X%08X%08X' % tuple(id_ints)
-
-        if self._id is None:
-            self._id = compute_id(self)
+            # into the portion that gets used (i.e. 32 bit words 3 and 4 are xored into
+            # words 0 and 1)
+            digest = int(binascii.hexlify(self.get_id_digest()), 16)
+            id = (digest >> 64) ^ ((digest & 0xFFFFFFFFFFFFFFFF) << 32)
+            self._id = '%024X' % id
 
         return self._id
 
+    # Returns "ID /* comment */" fragment written wherever the object is referenced.
+    # The fragment is rendered only once, so this must not be called before the
+    # object graph is frozen (see PBXObjects.assign_ids)
+    def get_reference(self):
+
+        if self._reference is None:
+            comment = self.get_comment()
+            if comment is None:
+                self._reference = self.get_id()
+            else:
+                self._reference = self.get_id() + " /* " + comment + " */"
+
+        return self._reference
+
     def _should_output_class_name(self):
         return True
 
+    # Returns True if object's text is determined by its ID alone (and thus previously
+    # written object with the same ID can be reused without comparing properties)
+    def is_determined_by_id(self):
+        return False
+
+    # Returns digest of everything that affects how object is written and is not
+    # determined by its ID: properties, with referenced objects represented by IDs
+    # (their comments are derived from hashables, same as IDs)
+    def get_fingerprint(self):
+        return PBXObject._fingerprint_digest(PBXObject._fingerprint_value(self._properties or {}))
+
+    # JSON (unlike repr) encodes strings the same in python 2 and 3
+    @staticmethod
+    def _fingerprint_digest(value):
+        return hashlib.sha1(json.dumps(value, separators = (",", ":")).encode("ascii")).hexdigest()
+
+    @staticmethod
+    def _fingerprint_value(value):
+        if isinstance(value, str) or isinstance(value, unicode):
+            return value
+        elif isinstance(value, PBXReference):
+            return ("ref", value.referenced_object.get_id())
+        elif isinstance(value, PBXObject):
+            return ("object", PBXObject._fingerprint_value(value._properties or {}))
+        elif isinstance(value, list):
+            return [PBXObject._fingerprint_value(v) for v in value]
+        elif isinstance(value, dict):
+            return sorted((k, PBXObject._fingerprint_value(v)) for k, v in value.items())
+        return value
+
+    # Returns True if this object would be written the same as previous object (parsed
+    # from previous project file). Comments of referenced objects are derived from their
+    # hashables, so it's enough to compare IDs of referenced objects.
+    def matches_previous(self, previous):
+        properties = self._properties or {}
+        if self._should_output_class_name():
+            if previous.get("isa") != self.__class__.__name__:
+                return False
+            if len(previous) != len(properties) + 1:
+                return False
+        elif len(previous) != len(properties):
+            return False
+
+        for key, value in properties.items():
+            if not PBXObject._matches_previous_value(value, previous.get(key)):
+                return False
+        return True
+
+    @staticmethod
+    def _matches_previous_value(value, previous):
+        if isinstance(value, bool):
+            return previous == ("YES" if value else "NO")
+        elif isinstance(value, int):
+            return previous == str(value)
+        elif isinstance(value, str) or isinstance(value, unicode):
+            return previous == value
+        elif isinstance(value, PBXReference):
+            return previous == value.referenced_object.get_id()
+        elif isinstance(value, PBXObject):
+            return isinstance(previous, dict) and value.matches_previous(previous)
+        elif isinstance(value, list):
+            if not isinstance(previous, list) or len(previous) != len(value):
+                return False
+            for v, p in zip(value, previous):
+                if not PBXObject._matches_previous_value(v, p):
+                    return False
+            return True
+        else:
+            if not isinstance(previous, dict) or len(previous) != len(value):
+                return False
+            for k, v in value.items():
+                if not PBXObject._matches_previous_value(v, previous.get(k)):
+                    return False
+            return True
+
     def write_object(self, indent, file):
         items = collections.OrderedDict()
 
         if (self._should_output_class_name()):
             items["isa"] = self.__class__.__name__
 
-        for key, value in sorted(self._properties.items()):
-            items[key] = value
+        if self._properties is not None:
+            for key, value in sorted(self._properties.items()):
+                items[key] = value
 
         PBXObject._write_iterable(items.items(), self._single_line, indent, file)
 
@@ -166,6 +358,17 @@ class PBXObject:
         write_value(indent + 1, value)
         file.write(";")
 
+    # Returns encoded bool, int or string value, None for other values
+    @staticmethod
+    def _encode_scalar(value, single_line):
+        if isinstance(value, bool):
+            return "YES" if value else "NO"
+        elif isinstance(value, int):
+            return str(value)
+        elif isinstance(value, str) or isinstance(value, unicode):
+            return PBXObject._encode_string(value, single_line)
+        return None
+
     @staticmethod
     def _write_iterable(iterable, single_line, indent, file):
 
@@ -225,9 +428,43 @@ class PBXObject:
     # XCObject._encode_string.  See that function.
     _escaped = re.compile('[\\\\"]|[\x00-\x1f]')
 
+    # Character sets equivalent to _unquoted and _escaped, used to avoid regex
+    # work for common strings
+    _unquoted_chars = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789$./_")
+    _escaped_chars = frozenset(['\\', '"'] + [chr(i) for i in xrange(0x20)])
+
     @staticmethod
     def _encode_string(value, single_line):
-        """Encodes a string to be placed in the project file output, mimicking Xcode behavior."""
+        """Encodes a string to be placed in the project file output, mimicking Xcode behavior.
+
+        Results are memoized, see _encoded_strings.
+        """
+        global _encoded_strings_hits, _encoded_strings_misses
+
+        key = (value, single_line)
+        encoded = _encoded_strings.get(key)
+        if encoded is not None:
+            _encoded_strings_hits += 1
+            return encoded
+
+        _encoded_strings_misses += 1
+        if len(_encoded_strings) >= _encoded_strings_limit:
+            _encoded_strings.clear()
+
+        if value and "___" not in value and PBXObject._unquoted_chars.issuperset(value):
+            encoded = value
+        elif PBXObject._escaped_chars.isdisjoint(value):
+            # _unquoted can't match a string without control characters that has
+            # characters outside of its range, and there is nothing to escape
+            encoded = '"' + value + '"'
+        else:
+            encoded = PBXObject._encode_string_uncached(value, single_line)
+
+        _encoded_strings[key] = encoded
+        return encoded
+
+    @staticmethod
+    def _encode_string_uncached(value, single_line):
 
         def encode_transform(match):
             # This function works closely with _EncodeString.  It will only be called
@@ -281,6 +518,8 @@ class PBXObject:
 
 class PBXContainer(PBXObject):
 
+    __slots__ = ()
+
     def __init__(self):
         PBXObject.__init__(self)
         self.set_property("archiveVersion", 1)
@@ -304,27 +543,61 @@ class PBXContainer(PBXObject):
 
 # Represents the Objects section of PBX file - wraps properties
 # in /* Begin XXX section */ and /* End XXX section */ comments
+#
+# Objects are kept in per-class buckets as they are added. IDs are not needed
+# until the objects are written; assign_ids() computes them in single batch,
+# checks for collisions and orders every bucket by ID.
 class PBXObjects(PBXObject):
 
+    __slots__ = ("_buckets", "_ids_assigned", "_previous_objects", "fingerprints", "reused_count")
+
+    def __init__(self, hash_parent = None):
+        PBXObject.__init__(self, hash_parent)
+        self._buckets = {}
+        self._ids_assigned = False
+        self._previous_objects = None
+        self.fingerprints = None
+        self.reused_count = 0
+
+    # Enables recording of fingerprints (ID -> fingerprint) while writing, to be passed
+    # to PBXObjectMap next time. Objects that are unchanged since previous project file
+    # (PBXObjectMap, can be None) are written by copying their previous text.
+    def set_incremental(self, previous_objects):
+        self._previous_objects = previous_objects
+        self.fingerprints = {}
+
     def write_object(self, indent, file):
 
-        file.write("{\n")
-        object_by_class = {}
+        if not self._ids_assigned:
+            self.assign_ids()
 
-        for key, value in self._properties.items():
-            assert(isinstance(value, PBXObject))
-            class_name = value.__class__.__name__
-            if class_name not in object_by_class:
-                object_by_class[class_name] = {}
-            object_by_class[class_name][key] = value
+        file.write("{\n")
 
-        for class_name, objects in sorted(object_by_class.items()):
+        for class_name, objects in sorted(self._buckets.items()):
             file.write("\n/* Begin " + class_name + " section */\n")
 
-            for key2, value2 in sorted(objects.items()):
-                file.write("\t" * (indent + 1))
-                PBXObject._write_single_property(key2, value2, False, indent, file)
-                file.write("\n")
+            # same as _write_single_property(id, value, False, indent, file), without
+            # going through value type checks
+            prefix = _indentation[indent + 1]
+            previous_objects = self._previous_objects
+            fingerprints = self.fingerprints
+            for value in objects:
+                fingerprint = None
+                if fingerprints is not None and not value.is_determined_by_id():
+                    fingerprint = value.get_fingerprint()
+                    fingerprints[value.get_id()] = fingerprint
+                if previous_objects is not None:
+                    text = previous_objects.get_reusable_text(value, fingerprint)
+                    if text is not None:
+                        file.write(text)
+                        file.flush()
+                        self.reused_count += 1
+                        continue
+                file.write(prefix + value.get_reference() + " = ")
+                value.write_object(indent + 1, file)
+                file.write(";\n")
+                # lets streaming output process content in chunks
+                file.flush()
 
             file.write("/* End " + class_name + " section */\n")
 
@@ -333,15 +606,38 @@ class PBXObjects(PBXObject):
     def _should_output_class_name(self):
         return False
 
+    def get_object_count(self):
+        return sum(len(bucket) for bucket in self._buckets.values())
+
     def add_object(self, o):
-        # Assertion here means hash collision
-        assert(self._properties.get(o.get_id()) == None)
-        self.set_property(o.get_id(), o)
+        assert(isinstance(o, PBXObject))
+        bucket = self._buckets.get(o.__class__.__name__)
+        if bucket is None:
+            bucket = []
+            self._buckets[o.__class__.__name__] = bucket
+        bucket.append(o)
+        self._ids_assigned = False
+
+    # Computes IDs of all objects
+    def assign_ids(self):
+        ids = set()
+        for bucket in self._buckets.values():
+            for o in bucket:
+                id = o.get_id()
+                # Assertion here means hash collision
+                assert(id not in ids)
+                ids.add(id)
+            bucket.sort(key = lambda o : o._id)
+        self._ids_assigned = True
 
 class PBXFileReference(PBXObject):
+
+    __slots__ = ("ext",)
+
+    _single_line = True
+
     def __init__(self, parent, file_name, path = None):
         PBXObject.__init__(self, parent)
-        self._single_line = True
         if path == None:
             self.set_property("path", file_name)
         else:
@@ -361,6 +657,33 @@ class PBXFileReference(PBXObject):
     def get_name(self):
         return self.get_property("path")
 
+    # Name, path and file type of references in groups are part of hashables;
+    # build products are modified after creation
+    def is_determined_by_id(self):
+        return self._properties.get("sourceTree") == "<group>"
+
+    # All properties file reference can have, in the order they are written
+    _property_order = ("explicitFileType", "includeInIndex", "lastKnownFileType", "name", "path", "sourceTree")
+
+    # Specialized version of PBXObject.write_object
+    def write_object(self, indent, file):
+        properties = self._properties
+        parts = ["{isa = PBXFileReference;"]
+        for key in PBXFileReference._property_order:
+            if key in properties:
+                value = PBXObject._encode_scalar(properties[key], True)
+                if value is None:
+                    break
+                parts.append(" " + key + " = " + value + ";")
+
+        if len(parts) != len(properties) + 1:
+            # unexpected properties, use generic serializer
+            PBXObject.write_object(self, indent, file)
+            return
+
+        parts.append(" }")
+        file.write("".join(parts))
+
     def make_build_product_executable(self):
         self.set_property("lastKnownFileType", "compiled.mach-o.executable")
         self.set_property("sourceTree", "BUILT_PRODUCTS_DIR")
@@ -420,6 +743,9 @@ class PBXFileReference(PBXObject):
     }
 
 class PBXFrameworkBuildPhase(PBXObject):
+
+    __slots__ = ()
+
     def __init__(self, parent):
         PBXObject.__init__(self, parent)
 
@@ -427,6 +753,9 @@ class PBXFrameworkBuildPhase(PBXObject):
         return "Frameworks"
 
 class PBXSourcesBuildPhase(PBXObject):
+
+    __slots__ = ()
+
     def __init__(self, parent):
         PBXObject.__init__(self, parent)
         self.set_property("buildActionMask", 2147483647)
@@ -440,11 +769,18 @@ class PBXSourcesBuildPhase(PBXObject):
         self.get_property("files").append(PBXReference(build_file))
 
 class PBXBuildFile(PBXObject):
-    def __init__(self, parent, file_ref, build_phase):
+
+    __slots__ = ("_file_ref", "_build_phase", "_legacy_hashables")
+
+    _single_line = True
+
+    # legacy_hashables hashes complete hashables of file reference and build phase
+    # instead of their digests; this results in IDs generated by older versions
+    def __init__(self, parent, file_ref, build_phase, legacy_hashables = False):
         PBXObject.__init__(self, parent)
-        self._single_line = True
         self._file_ref = file_ref
         self._build_phase = build_phase
+        self._legacy_hashables = legacy_hashables
         self.set_property("fileRef", PBXReference(file_ref))
 
     def get_comment(self):
@@ -453,13 +789,30 @@ class PBXBuildFile(PBXObject):
     def name(self):
         return self._file_ref.get_name()
 
+    def is_determined_by_id(self):
+        return len(self._properties) == 1
+
+    # Specialized version of PBXObject.write_object
+    def write_object(self, indent, file):
+        file_ref = self._properties.get("fileRef")
+        if len(self._properties) != 1 or not isinstance(file_ref, PBXReference):
+            PBXObject.write_object(self, indent, file)
+            return
+        file.write("{isa = PBXBuildFile; fileRef = " + file_ref.get_reference() + "; }")
+
     def _additional_hashables(self):
-        l = []
-        l.extend(self._file_ref.get_hashables())
-        l.extend(self._build_phase.get_hashables())
-        return l
+        if self._legacy_hashables:
+            l = []
+            l.extend(self._file_ref.get_hashables())
+            l.extend(self._build_phase.get_hashables())
+            return l
+        # same as with hash parent, digests are cached and much shorter than hashables
+        return [self._file_ref.get_id_digest(), self._build_phase.get_id_digest()]
 
 class PBXProject(PBXObject):
+
+    __slots__ = ("name",)
+
     def __init__(self, parent, name):
         PBXObject.__init__(self, parent)
         self.name = name
@@ -492,12 +845,26 @@ class PBXProject(PBXObject):
         self.set_property("mainGroup", PBXReference(group))
         self.set_property("productRefGroup", PBXReference(group))
 
-    def write_object(self, indent, file):
+    def _sort_targets(self):
         targets = self.get_property("targets")
         targets.sort(key = lambda t : t.referenced_object.get_name())
+
+    def get_fingerprint(self):
+        self._sort_targets()
+        return PBXObject.get_fingerprint(self)
+
+    def matches_previous(self, previous):
+        self._sort_targets()
+        return PBXObject.matches_previous(self, previous)
+
+    def write_object(self, indent, file):
+        self._sort_targets()
         PBXObject.write_object(self, indent, file)
 
 class XCBuildConfiguration(PBXObject):
+
+    __slots__ = ()
+
     def __init__(self, parent, name):
         PBXObject.__init__(self, parent)
         self.set_property("name", name)
@@ -509,7 +876,54 @@ class XCBuildConfiguration(PBXObject):
     def build_settings(self):
         return self.get_property("buildSettings")
 
+    # Specialized version of PBXObject.get_fingerprint
+    def get_fingerprint(self):
+        properties = self._properties
+        if len(properties) != 2 or not isinstance(properties.get("buildSettings"), dict):
+            return PBXObject.get_fingerprint(self)
+        value = (sorted(properties["buildSettings"].items()), properties["name"])
+        return PBXObject._fingerprint_digest(value)
+
+    # Specialized version of PBXObject.write_object
+    def write_object(self, indent, file):
+        properties = self._properties
+        name = properties.get("name")
+        build_settings = properties.get("buildSettings")
+
+        if (len(properties) != 2 or not isinstance(build_settings, dict) or
+            PBXObject._encode_scalar(name, False) is None):
+            PBXObject.write_object(self, indent, file)
+            return
+
+        line = "\n" + _indentation[indent + 1]
+        setting_line = "\n" + _indentation[indent + 2]
+        parts = ["{", line, "isa = XCBuildConfiguration;", line, "buildSettings = {"]
+        for key, value in sorted(build_settings.items()):
+            parts.append(setting_line + key + " = ")
+            if isinstance(value, list):
+                parts.append("(" + setting_line)
+                for v in value:
+                    encoded = PBXObject._encode_scalar(v, False)
+                    if encoded is None:
+                        PBXObject.write_object(self, indent, file)
+                        return
+                    parts.append("\t" + encoded + "," + setting_line)
+                parts.append(");")
+            else:
+                encoded = PBXObject._encode_scalar(value, False)
+                if encoded is None:
+                    PBXObject.write_object(self, indent, file)
+                    return
+                parts.append(encoded + ";")
+        parts.append(line + "};")
+        parts.append(line + "name = " + PBXObject._encode_scalar(name, False) + ";")
+        parts.append("\n" + _indentation[indent] + "}")
+        file.write("".join(parts))
+
 class XCConfigurationList(PBXObject):
+
+    __slots__ = ("target",)
+
     def __init__(self, parent, target):
         PBXObject.__init__(self, parent)
         self.target = target
@@ -522,6 +936,9 @@ class XCConfigurationList(PBXObject):
         return "Build configuration list for " + self.target.__class__.__name__ + " \"" + self.target.get_name() + "\""
 
 class PBXGroup(PBXObject):
+
+    __slots__ = ("name", "path", "_child_map", "_child_sort_keys")
+
     def __init__(self, parent, name = None, path = None):
         PBXObject.__init__(self, parent)
 
@@ -541,10 +958,16 @@ class PBXGroup(PBXObject):
         self.set_property("children", [])
 
         self._child_map = {}
+        self._child_sort_keys = []
 
+    # Children are kept sorted (groups first, then case insensitive by name)
     def add_child(self, group):
-        self.get_property("children").append(PBXReference(group))
-        self._child_map[group.get_name()] = group
+        name = group.get_name()
+        sort_key = ("1" if isinstance(group, PBXGroup) else "2") + _casefold(name)
+        index = bisect.bisect_right(self._child_sort_keys, sort_key)
+        self._child_sort_keys.insert(index, sort_key)
+        self.get_property("children").insert(index, PBXReference(group))
+        self._child_map[name] = group
 
     def get_child(self, name):
         return self._child_map.get(name, None)
@@ -558,25 +981,33 @@ class PBXGroup(PBXObject):
             l.extend([self.path])
         return l
 
+    # Specialized version of PBXObject.write_object
     def write_object(self, indent, file):
+        properties = self._properties
+        known = 1 # children
+        for key in ("name", "path", "sourceTree"):
+            if key in properties:
+                known += 1
+        if known != len(properties):
+            PBXObject.write_object(self, indent, file)
+            return
+
+        line = "\n" + _indentation[indent + 1]
+        parts = ["{", line, "isa = PBXGroup;", line, "children = (", line]
+        for child in properties["children"]:
+            parts.append("\t" + child.get_reference() + "," + line)
+        parts.append(");")
+        for key in ("name", "path", "sourceTree"):
+            value = properties.get(key)
+            if value is not None:
+                parts.append(line + key + " = " + PBXObject._encode_string(value, False) + ";")
+        parts.append("\n" + _indentation[indent] + "}")
+        file.write("".join(parts))
 
-        # python 2.7 does not have casefold, we'll use lower() instead
-        cf = lambda x : x.casefold()
-        try:
-            "".casefold()
-        except AttributeError:
-            cf = lambda x : x.lower()
-
-        def sort_key(x):
-            ref = x.referenced_object
-            prefix = "1" if isinstance(ref, PBXGroup) else "2"
-            return prefix + cf(ref.get_name())
+class PBXNativeTarget(PBXObject):
 
-        children = self.get_property("children")
-        children.sort(key=sort_key)
-        PBXObject.write_object(self, indent, file)
+    __slots__ = ()
 
-class PBXNativeTarget(PBXObject):
     def __init__(self, parent, name, product_name, product_type):
         PBXObject.__init__(self, parent)
         self.set_property("name", name)
@@ -595,6 +1026,9 @@ class PBXNativeTarget(PBXObject):
         self.set_property("buildConfigurationList", PBXReference(bcl))
 
 class PBXLegacyTarget(PBXObject):
+
+    __slots__ = ()
+
     def __init__(self, parent, name, buildToolPath, buildArgumentsString, buildWorkingDir):
 
         PBXObject.__init__(self, parent)
@@ -618,14 +1052,15 @@ class PBXLegacyTarget(PBXObject):
 
 # Intermediate object that renders reference (just ID + comment) to another PBXObject
 class PBXReference(PBXObject):
+
+    __slots__ = ("referenced_object",)
+
     def __init__(self, referenced_object):
         PBXObject.__init__(self, None)
         self.referenced_object = referenced_object
 
+    def get_reference(self):
+        return self.referenced_object.get_reference()
+
     def write_object(self, indent, file):
-        file.write(self.referenced_object.get_id())
-        comment = self.referenced_object.get_comment()
-        if comment is not None:
-            file.write(" /* ")
-            file.write(comment)
-            file.write(" */")
+        file.write(self.get_reference())
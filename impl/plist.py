@@ -0,0 +1,116 @@
+#
+# Parser of ASCII (OpenStep) property lists, as used by project.pbxproj
+#
+
+import re
+
+try:
+    unicode
+except NameError:
+    unicode = str
+
+try:
+    unichr
+except NameError:
+    unichr = chr
+
+class PlistError(Exception):
+    pass
+
+# Whitespace and comments (no group), quoted string, unquoted string, punctuation,
+# anything else (error)
+_token = re.compile(r'\s+|/\*.*?\*/|//[^\n]*|'
+                    r'("(?:[^"\\]|\\.)*")|([A-Za-z0-9_$+/:.\-]+)|([{}()=;,])|(.)', re.S)
+
+_escape = re.compile(r'\\(U[0-9A-Fa-f]{4}|[0-7]{1,3}|.)', re.S)
+
+_escape_map = {
+    'a': '\a',
+    'b': '\b',
+    'f': '\f',
+    'n': '\n',
+    'r': '\r',
+    't': '\t',
+    'v': '\v',
+}
+
+def _unescape_sequence(match):
+    sequence = match.group(1)
+    if sequence[0] == 'U' and len(sequence) == 5:
+        return unichr(int(sequence[1:], 16))
+    if sequence[0] in '01234567':
+        return unichr(int(sequence, 8))
+    return _escape_map.get(sequence, sequence)
+
+def _unescape(value):
+    if '\\' not in value:
+        return value
+    return _escape.sub(_unescape_sequence, value)
+
+class _Parser:
+
+    def __init__(self, text):
+        # (quoted, unquoted, punctuation, invalid) tuples, all empty for whitespace
+        self.tokens = [t for t in _token.findall(text) if t != ("", "", "", "")]
+        self.position = 0
+
+    # Returns (kind, value) of next token; kind is "string", punctuation character or "end"
+    def _next(self):
+        if self.position == len(self.tokens):
+            return "end", None
+        quoted, unquoted, punctuation, invalid = self.tokens[self.position]
+        self.position += 1
+        if quoted:
+            return "string", _unescape(quoted[1:-1])
+        if unquoted:
+            return "string", unquoted
+        if punctuation:
+            return punctuation, None
+        raise PlistError("Invalid character '%s' at token %d" % (invalid, self.position))
+
+    def _expect(self, expected):
+        kind, value = self._next()
+        if kind != expected:
+            raise PlistError("Expected '%s' at token %d" % (expected, self.position))
+
+    def parse_value(self, token = None):
+        kind, value = token or self._next()
+        if kind == "string":
+            return value
+        elif kind == "{":
+            return self._parse_dictionary()
+        elif kind == "(":
+            return self._parse_array()
+        raise PlistError("Unexpected '%s' at token %d" % (kind, self.position))
+
+    def _parse_dictionary(self):
+        result = {}
+        while True:
+            kind, key = self._next()
+            if kind == "}":
+                return result
+            if kind != "string":
+                raise PlistError("Expected key at token %d" % self.position)
+            self._expect("=")
+            result[key] = self.parse_value()
+            self._expect(";")
+
+    def _parse_array(self):
+        result = []
+        while True:
+            token = self._next()
+            if token[0] == ")":
+                return result
+            result.append(self.parse_value(token))
+            kind, value = self._next()
+            if kind == ")":
+                return result
+            if kind != ",":
+                raise PlistError("Expected ',' at token %d" % self.position)
+
+def parse(text):
+    """Parses ASCII property list; returns nested dictionaries, lists and strings."""
+    parser = _Parser(text)
+    result = parser.parse_value()
+    parser._expect("end")
+    return result
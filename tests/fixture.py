@@ -0,0 +1,104 @@
+#
+# Synthetic GN project used by tests
+#
+
+import json
+import os
+import posixpath
+
+_directories = ["base", "net", "third_party/zlib", "third_party/icu/src", "ui/gfx", "ui/views", "chrome/browser"]
+
+_types = ["source_set", "static_library", "executable", "shared_library", "group", "action",
+          "copy", "bundle_data", "create_bundle"]
+
+_extensions = [".cc", ".h", ".c", ".mm", ".cpp", ".txt"]
+
+def _touch(path):
+    directory = os.path.dirname(path)
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(path, "w") as f:
+        f.write("#\n")
+
+def _create_target(src, index, dependencies, targets):
+    directory = _directories[index % len(_directories)]
+    if index >= len(_directories):
+        directory += "/sub%d" % (index // len(_directories))
+    target_type = _types[index % len(_types)]
+
+    sources = []
+    for j in range(5 + index % 7):
+        sub = "inner/" if j % 3 == 0 else ""
+        sources.append("//%s/%sfile_%d_%d%s" % (directory, sub, index, j, _extensions[j % len(_extensions)]))
+    for source in sources:
+        _touch(src + "/" + source[2:])
+    sources.append("//out/gen/x%d.cc" % index)
+
+    target = {
+        "type" : target_type,
+        "toolchain" : "//build/toolchain:x64" if index % 11 else "//build/toolchain:other",
+        "sources" : sources,
+        "include_dirs" : ["//", "//%s/" % directory, "//out/gen/"],
+        "defines" : ["_DEBUG", "FOO=\"bar\"", "A<B", "PATH='a&b'"],
+        "cflags" : ["/FIfoo.h", "-std=c++14", "-Wall"],
+        "cflags_c" : ["-std=c11"],
+        "cflags_objc" : ["-Fsome/fw"],
+        "deps" : dependencies[-3:],
+        "source_outputs" : dict((s, ["obj/%s/t%d.%s.obj" % (directory, index, posixpath.basename(s))]) for s in sources),
+        "lib_dirs" : [],
+    }
+    if index % 4 == 0:
+        target["output_name"] = "out%d" % index
+    if index % 5 == 0:
+        target["precompiled_header"] = "pch.h"
+        target["precompiled_source"] = sources[0]
+        _touch(src + "/" + directory + "/pch.h")
+    if target_type == "create_bundle":
+        target["bundle_data"] = {
+            "product_type" : "com.apple.product-type.application",
+            "root_dir_output" : "//out/App%d.app/Contents" % index
+        }
+    if target_type == "bundle_data":
+        target["deps"] = [d for d in dependencies if targets[d]["type"] == "executable"][-1:]
+
+    _touch(src + "/" + directory + "/BUILD.gn")
+    return "//%s:t%d" % (directory, index), target
+
+def write_project(project, path):
+    with open(path, "w") as f:
+        json.dump(project, f, indent=1, sort_keys=True)
+
+def create_project(root, target_count=12):
+    """Creates source tree with target_count targets under root.
+
+    Returns:
+      (path of project.json in build directory, project dictionary)
+
+    """
+    src = root + "/src"
+    for name in ["build/config/BUILDCONFIG.gn", "BUILD.gn", ".gn", "out/args.gn"]:
+        _touch(src + "/" + name)
+
+    targets = {}
+    dependencies = []
+    for index in range(target_count):
+        name, target = _create_target(src, index, dependencies, targets)
+        targets[name] = target
+        dependencies.append(name)
+
+    build_files = ["build/config/BUILDCONFIG.gn", "BUILD.gn", ".gn", "out/args.gn"]
+    build_files += sorted(set(n[2:n.index(":")] + "/BUILD.gn" for n in targets))
+    with open(src + "/out/build.ninja.d", "w") as f:
+        f.write(" ".join(["build.ninja:"] + [src + "/" + b for b in build_files]))
+
+    project = {
+        "build_settings" : {
+            "root_path" : src,
+            "build_dir" : "//out/",
+            "default_toolchain" : "//build/toolchain:x64"
+        },
+        "targets" : targets
+    }
+    path = src + "/out/project.json"
+    write_project(project, path)
+    return path, project
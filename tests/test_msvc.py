@@ -0,0 +1,77 @@
+#
+# Generated MSVC projects, filters and solution must not change unintentionally
+#
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import fixture
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from impl.common import Project
+from impl.msvc import ProjectGenerator
+
+_data = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "msvc")
+
+# Returns generated files (relative to build directory) that are compared with stored ones
+def generated_files(build_dir):
+    res = []
+    for directory, directories, files in os.walk(build_dir):
+        for name in files:
+            if name.endswith((".vcxproj", ".filters", ".sln")):
+                res.append(os.path.relpath(os.path.join(directory, name), build_dir).replace(os.sep, "/"))
+    return sorted(res)
+
+def generate(project_file, solution_name="Solution"):
+    with open(project_file) as f:
+        project = Project(json.load(f))
+    generator = ProjectGenerator(project, solution_name, tools_version="15.0", platform_toolset="v141",
+                                 target_platform_version="10.0.17134.0")
+    # location of the generator would otherwise end up in stored files
+    generator.directory_lock_path = "directory_lock.exe"
+    generator.generate()
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+class MsvcTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.project_file = fixture.create_project(self.root)[0]
+        self.build_dir = os.path.dirname(self.project_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_files(self):
+        generate(self.project_file)
+
+        files = generated_files(self.build_dir)
+        self.assertEqual(files, generated_files(_data))
+        for name in files:
+            content = read(os.path.join(self.build_dir, name))
+            expected = read(os.path.join(_data, name))
+            if name.endswith(".sln") and sys.version_info[0] < 3:
+                # order of projects follows (unordered) dictionary of targets in python 2
+                content = sorted(content.splitlines())
+                expected = sorted(expected.splitlines())
+            self.assertEqual(content, expected, name)
+
+    # files of previous solution name are stale
+    def test_renamed_solution(self):
+        generate(self.project_file)
+        generate(self.project_file, "Renamed")
+
+        self.assertTrue(os.path.exists(os.path.join(self.build_dir, "Renamed.sln")))
+        self.assertFalse(os.path.exists(os.path.join(self.build_dir, "Solution.sln")))
+        self.assertFalse(os.path.exists(os.path.join(self.build_dir, "Solution.guids.json")))
+
+if __name__ == "__main__":
+    unittest.main()
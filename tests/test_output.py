@@ -0,0 +1,195 @@
+#
+# OutputWriter must touch generated files only when their content changes
+#
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import fixture
+
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _root)
+
+from impl import output
+from impl.output import OutputWriter
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+class OutputWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.manifest_path = os.path.join(self.root, "test.outputs.json")
+        self.reads = []
+
+    def tearDown(self):
+        if hasattr(output, "open"):
+            del output.open
+        if hasattr(output, "_replace_original"):
+            output._replace = output._replace_original
+            del output._replace_original
+        shutil.rmtree(self.root)
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    # Records existing files opened for reading by writer
+    def count_reads(self):
+        def counting_open(path, mode="r"):
+            if "r" in mode:
+                self.reads.append(path)
+            return open(path, mode)
+        output.open = counting_open
+
+    def generate(self, files, **kwargs):
+        outputs = OutputWriter(self.manifest_path, **kwargs)
+        for name, content in sorted(files.items()):
+            outputs.write(self.path(name), content)
+        outputs.commit()
+        return outputs
+
+    def temporary_files(self):
+        res = []
+        for directory, directories, files in os.walk(self.root):
+            res.extend(name for name in files if name.endswith(".gn-tmp"))
+        return res
+
+    def test_unchanged_confirmed_by_manifest(self):
+        self.generate({"a.txt": "a\n"})
+        self.count_reads()
+
+        outputs = OutputWriter(self.manifest_path)
+        self.assertFalse(outputs.write(self.path("a.txt"), "a\n"))
+        stream = outputs.open(self.path("a.txt"))
+        stream.write("a\n")
+        self.assertFalse(stream.close())
+        self.assertEqual(outputs.commit()[0], 0)
+
+        self.assertEqual(self.reads, [self.manifest_path])
+
+    def test_externally_edited_file_is_rewritten(self):
+        self.generate({"a.txt": "a\n", "b.txt": "b\n"})
+        with open(self.path("a.txt"), "w") as f:
+            f.write("edited\n")
+        with open(self.path("b.txt"), "w") as f:
+            f.write("edited\n")
+
+        outputs = OutputWriter(self.manifest_path)
+        self.assertTrue(outputs.write(self.path("a.txt"), "a\n"))
+        stream = outputs.open(self.path("b.txt"))
+        stream.write("b\n")
+        self.assertTrue(stream.close())
+        self.assertEqual(outputs.commit()[0], 2)
+
+        self.assertEqual(read(self.path("a.txt")), "a\n")
+        self.assertEqual(read(self.path("b.txt")), "b\n")
+        self.assertFalse(outputs.has_changes())
+
+    def test_late_files_are_replaced_last(self):
+        replaced = []
+        output._replace_original = output._replace
+        def recording_replace(source, destination):
+            replaced.append(os.path.basename(destination))
+            output._replace_original(source, destination)
+        output._replace = recording_replace
+
+        outputs = OutputWriter(self.manifest_path)
+        outputs.write(self.path("solution.sln"), "s\n", late=True)
+        outputs.write(self.path("a.txt"), "a\n")
+        stream = outputs.open(self.path("b.txt"))
+        stream.write("b\n")
+        stream.close()
+
+        # nothing is replaced until commit
+        self.assertFalse(os.path.exists(self.path("a.txt")))
+        self.assertEqual(sorted(self.temporary_files()), ["a.txt.gn-tmp", "b.txt.gn-tmp", "solution.sln.gn-tmp"])
+
+        outputs.commit()
+        self.assertEqual(replaced, ["a.txt", "b.txt", "solution.sln"])
+        self.assertEqual(self.temporary_files(), [])
+
+    def test_discard_removes_temporary_files(self):
+        self.generate({"a.txt": "a\n"})
+
+        outputs = OutputWriter(self.manifest_path)
+        outputs.write(self.path("a.txt"), "changed\n")
+        outputs.write(self.path("sub/b.txt"), "b\n")
+        stream = outputs.open(self.path("c.txt"))
+        stream.write("c\n")
+        stream.flush()
+        self.assertEqual(len(self.temporary_files()), 3)
+
+        outputs.discard()
+        self.assertEqual(self.temporary_files(), [])
+        self.assertEqual(read(self.path("a.txt")), "a\n")
+        self.assertFalse(os.path.exists(self.path("sub/b.txt")))
+        self.assertFalse(os.path.exists(self.path("c.txt")))
+
+    def test_stale_files_are_removed(self):
+        self.generate({"a.txt": "a\n", "sub/b.txt": "b\n"})
+        self.generate({"a.txt": "a\n"})
+
+        self.assertTrue(os.path.exists(self.path("a.txt")))
+        self.assertFalse(os.path.exists(self.path("sub")))
+        self.assertEqual(list(OutputWriter(self.manifest_path).manifest.entries), [self.path("a.txt")])
+
+    def test_stale_files_are_kept(self):
+        self.generate({"a.txt": "a\n", "sub/b.txt": "b\n"})
+        outputs = self.generate({"a.txt": "a\n"}, remove_stale=False)
+
+        self.assertTrue(os.path.exists(self.path("sub/b.txt")))
+        self.assertFalse(outputs.has_changes())
+        # file stays in manifest, so that later run without --keep-stale removes it
+        self.assertEqual(outputs.stale_files(), set([self.path("sub/b.txt")]))
+        self.generate({"a.txt": "a\n"})
+        self.assertFalse(os.path.exists(self.path("sub")))
+
+    def test_dry_run(self):
+        self.generate({"a.txt": "a\n", "b.txt": "b\n"})
+
+        outputs = self.generate({"a.txt": "a\n", "b.txt": "b\n"}, dry_run=True)
+        self.assertFalse(outputs.has_changes())
+
+        outputs = self.generate({"a.txt": "changed\n", "b.txt": "b\n"}, dry_run=True)
+        self.assertTrue(outputs.has_changes())
+        self.assertEqual(read(self.path("a.txt")), "a\n")
+
+        outputs = self.generate({"a.txt": "a\n"}, dry_run=True)
+        self.assertTrue(outputs.has_changes())
+        self.assertTrue(os.path.exists(self.path("b.txt")))
+        self.assertEqual(self.temporary_files(), [])
+
+class CheckTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.project_file = fixture.create_project(self.root)[0]
+        self.build_dir = os.path.dirname(self.project_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def run_xcode(self, *args):
+        with open(os.devnull, "w") as devnull:
+            return subprocess.call([sys.executable, os.path.join(_root, "xcode.py"), self.project_file] + list(args),
+                                   stdout=devnull)
+
+    def test_check_exit_status(self):
+        self.assertEqual(self.run_xcode("--check"), 1)
+        self.assertFalse(os.path.exists(os.path.join(self.build_dir, "Sources.xcodeproj")))
+
+        self.assertEqual(self.run_xcode(), 0)
+        self.assertEqual(self.run_xcode("--check"), 0)
+
+        with open(os.path.join(self.build_dir, "Sources.xcodeproj", "project.pbxproj"), "a") as f:
+            f.write("\n")
+        self.assertEqual(self.run_xcode("--check"), 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+#
+# Object IDs of generated Xcode projects must not change between versions of
+# the generator, otherwise Xcode loses per-user state (schemes, breakpoints)
+#
+
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import fixture
+
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_data = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+_object_id = re.compile(r'^\t\t([0-9A-F]{24}) (?:/\* (.*?) \*/ )?= ', re.M)
+
+# Returns sorted "ID comment" lines of objects in Sources and Products projects
+def read_ids(build_dir):
+    ids = []
+    for name in ("Sources", "Products"):
+        with open(os.path.join(build_dir, name + ".xcodeproj", "project.pbxproj")) as f:
+            ids.extend("%s %s %s" % (name, m.group(1), m.group(2) or "") for m in _object_id.finditer(f.read()))
+    return sorted(ids)
+
+def run_xcode(project_file, *args):
+    with open(os.devnull, "w") as devnull:
+        subprocess.check_call([sys.executable, os.path.join(_root, "xcode.py"), project_file] + list(args),
+                              stdout=devnull)
+
+def read_expected_ids(name):
+    with open(os.path.join(_data, name)) as f:
+        return f.read().splitlines()
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+class XcodeIdsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.project_file = fixture.create_project(self.root)[0]
+        self.build_dir = os.path.dirname(self.project_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_ids(self):
+        run_xcode(self.project_file)
+        self.assertEqual(read_ids(self.build_dir), read_expected_ids("xcode_ids.txt"))
+
+    # IDs generated by versions before digests of referenced objects were hashed
+    def test_legacy_ids(self):
+        run_xcode(self.project_file, "--legacy-ids")
+        self.assertEqual(read_ids(self.build_dir), read_expected_ids("xcode_ids_legacy.txt"))
+
+    # Complete projects with legacy IDs, as generated by versions before digests
+    # of referenced objects were hashed
+    def test_legacy_projects(self):
+        run_xcode(self.project_file, "--legacy-ids")
+        for name in ("Sources", "Products"):
+            self.assertEqual(read(os.path.join(self.build_dir, name + ".xcodeproj", "project.pbxproj")),
+                             read(os.path.join(_data, "xcode_legacy", name + ".pbxproj")), name)
+
+if __name__ == "__main__":
+    unittest.main()
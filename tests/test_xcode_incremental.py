@@ -0,0 +1,86 @@
+#
+# Projects updated incrementally (reusing unchanged objects of previous project
+# file) must be identical to projects serialized completely
+#
+
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import fixture
+
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_reused = re.compile(r'^Reused (\d+) of (\d+) object\(s\)', re.M)
+
+# Returns output of xcode.py
+def run_xcode(project_file, *args):
+    process = subprocess.Popen([sys.executable, os.path.join(_root, "xcode.py"), project_file] + list(args),
+                               stdout=subprocess.PIPE, universal_newlines=True)
+    output = process.communicate()[0]
+    if process.returncode != 0:
+        raise Exception("xcode.py failed with code %d:\n%s" % (process.returncode, output))
+    return output
+
+def read_projects(build_dir):
+    res = {}
+    for name in ("Sources", "Products"):
+        with open(os.path.join(build_dir, name + ".xcodeproj", "project.pbxproj")) as f:
+            res[name] = f.read()
+    return res
+
+class XcodeIncrementalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.project_file, self.project = fixture.create_project(self.root, 20)
+        self.build_dir = os.path.dirname(self.project_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    # Applies change to project, generates projects incrementally and completely
+    # and compares them; returns number of reused objects
+    def check_change(self, change):
+        change(self.project["targets"])
+        fixture.write_project(self.project, self.project_file)
+
+        output = run_xcode(self.project_file)
+        incremental = read_projects(self.build_dir)
+        run_xcode(self.project_file, "--no-incremental")
+        complete = read_projects(self.build_dir)
+
+        self.assertEqual(incremental, complete)
+        return sum(int(m.group(1)) for m in _reused.finditer(output))
+
+    def test_changes(self):
+        run_xcode(self.project_file)
+
+        names = sorted(self.project["targets"])
+
+        def add_source(targets):
+            targets[names[3]]["sources"].append("//base/new_file.cc")
+        def add_non_ascii_source(targets):
+            executable = [n for n in names if targets[n]["type"] == "executable"][0]
+            targets[executable]["sources"].append(u"//base/d\u00e9j\u00e0.cc")
+        def add_define(targets):
+            targets[names[7]]["defines"].append("NEW_DEFINE")
+        def remove_source(targets):
+            targets[names[12]]["sources"].pop(0)
+        def remove_target(targets):
+            del targets[names[15]]
+            for target in targets.values():
+                if names[15] in target["deps"]:
+                    target["deps"].remove(names[15])
+        def nothing(targets):
+            pass
+
+        for change in (add_source, add_non_ascii_source, add_define, remove_source, remove_target, nothing):
+            self.assertTrue(self.check_change(change) > 0, change.__name__)
+
+if __name__ == "__main__":
+    unittest.main()
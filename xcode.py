@@ -4,26 +4,40 @@
 # XCode project generator
 #
 
+import argparse
+import hashlib
+import io
 import json
+import multiprocessing
 import os
 import sys
 import itertools
 
-try:
-    from StringIO import StringIO
-except ImportError:
-    from io import StringIO
-
 from pprint import pprint
 
 from impl.pbx import *
 from impl.common import *
+from impl.output import OutputWriter
+
+# Returns digest of generator sources; project file written by other version of
+# generator is never used for incremental update
+def get_generator_digest():
+    digest = hashlib.sha1()
+    for name in ("pbx.py", "plist.py", "../xcode.py"):
+        with open(posixpath.join(get_script_dir(), name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
 
 class ProjectGenerator:
 
-    def __init__(self, project_definition, project_name):
+    # incremental reuses text of objects that didn't change since previous project file
+    def __init__(self, project_definition, project_name, outputs, legacy_ids = False, incremental = True):
 
         self.project_definition = project_definition
+        self.outputs = outputs
+        self.legacy_ids = legacy_ids
+        self.incremental = incremental
+        self.incremental_state_path = project_definition.get_absolute_build_path() + project_name + ".incremental.json"
 
         self.container = PBXContainer()
 
@@ -54,11 +68,21 @@ class ProjectGenerator:
 
         self.container.set_root_object(self.project)
 
+        # groups created by group_for_path, keyed by their project path ("//a/b")
+        self._groups = {}
+
+        # root groups and files in main group are referenced relative to project root
+        self._root_relative_path = project_definition.get_relative_path("//")
+
     def get_project_name(self):
         return self.project.get_name()
 
     def group_for_path(self, path):
 
+        group = self._groups.get(path)
+        if group is not None:
+            return group
+
         # For root items and items in output folder (args.gn) use main group
         if (path == "//" or
             (path + "/") == self.project_definition.build_dir):
@@ -69,24 +93,36 @@ class ProjectGenerator:
             return None
 
         assert path.startswith("//")
-        path = path[2:]
 
-        segments = path.split("/")
+        # find longest prefix of path that already has group
+        prefix = path
+        current_parent = None
+        while current_parent is None:
+            separator = prefix.rfind("/")
+            if separator <= 1:
+                prefix = "/"
+                current_parent = self.main_group
+            else:
+                prefix = prefix[:separator]
+                current_parent = self._groups.get(prefix)
 
-        current_parent = self.main_group
-        for segment in segments:
+        current_path = prefix
+        for segment in path[len(prefix) + 1:].split("/"):
+            current_path = current_path + "/" + segment
             group = current_parent.get_child(segment)
             if group is None:
-                path = None
+                group_path = None
 
                 # We override path for root groups
                 if current_parent == self.main_group:
-                    root = self.project_definition.get_relative_path("//")
-                    path = root + "/" + segment
+                    group_path = self._root_relative_path + "/" + segment
 
-                group = PBXGroup(current_parent, segment, path)
+                group = PBXGroup(current_parent, segment, group_path)
                 current_parent.add_child(group)
                 self.objects.add_object(group)
+            # don't cache paths that map to main group (see above)
+            if current_path != "//" and current_path + "/" != self.project_definition.build_dir:
+                self._groups[current_path] = group
             current_parent = group
 
         return current_parent
@@ -130,7 +166,7 @@ class ProjectGenerator:
 
         # add build files to source build phase
         for reference in compilable_references:
-            build_file = PBXBuildFile(sources_bf, reference, sources_bf)
+            build_file = PBXBuildFile(sources_bf, reference, sources_bf, self.legacy_ids)
             sources_bf.add_file(build_file)
             self.objects.add_object(build_file)
 
@@ -265,8 +301,7 @@ class ProjectGenerator:
 
                     if group == self.main_group:
                         if source.startswith("//"):
-                            root = self.project_definition.get_relative_path("//")
-                            path = root + "/" + source[2:]
+                            path = self._root_relative_path + "/" + source[2:]
 
                     # absolute path
                     if source.startswith("/") and not source.startswith("//"):
@@ -385,27 +420,67 @@ class ProjectGenerator:
             content = f.read()
 
             script_file = self.project_definition.get_absolute_build_path() + "invoke_ninja.py"
-            overwrite_file_if_different(script_file, content)
+            self.outputs.write(script_file, content)
 
     #
     #
     #
 
+    # Returns objects of previous project file, if it can be trusted: it must be unmodified
+    # since it was written (according to outputs manifest) by the same generator
+    def _load_previous_objects(self, project_file):
+        try:
+            with open(self.incremental_state_path, "r") as f:
+                state = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+        if (state.get("generator") != get_generator_digest() or
+            state.get("digest") != self.outputs.manifest.known_digest(project_file)):
+            return None
+
+        with io.open(project_file, "r", encoding="utf-8") as f:
+            return PBXObjectMap(f.read(), state.get("fingerprints"))
+
+    # State is written when outputs are committed, so it never describes uncommitted project file
+    def _save_incremental_state(self, digest):
+        self.outputs.write_state(self.incremental_state_path, json.dumps({
+            "generator" : get_generator_digest(),
+            "digest" : digest,
+            "fingerprints" : self.objects.fingerprints
+        }))
+
     def write(self):
 
-        output = StringIO()
+        project_folder = self.project_definition.get_absolute_build_path() + self.project.get_name() + ".xcodeproj"
+        project_file = project_folder + "/project.pbxproj"
+
+        self.objects.assign_ids()
+
+        previous_objects = None
+        if self.incremental:
+            previous_objects = self._load_previous_objects(project_file)
+            self.objects.set_incremental(previous_objects)
+
+        reset_encoded_string_stats()
+        output = self.outputs.open(project_file)
         self.container.write_object(0, output)
-        new_content = output.getvalue()
+        changed = output.close()
 
-        project_folder = self.project_definition.get_absolute_build_path() + self.project.get_name() + ".xcodeproj"
-        if not os.path.exists(project_folder):
-            os.makedirs(project_folder)
+        if previous_objects is not None:
+            print("Reused %d of %d object(s) from previous project file for %s" %
+                  (self.objects.reused_count, self.objects.get_object_count(), self.project.get_name()))
 
-        project_file = project_folder + "/project.pbxproj"
-        if not overwrite_file_if_different(project_file, new_content):
-            print("No changes detected - will not overwrite project file for " + self.project.get_name())
+        # nothing is encoded when all objects were reused
+        hits, misses = get_encoded_string_stats()
+        if hits + misses > 0:
+            print("Encoded string memo hit rate for " + self.project.get_name() + ": %.1f%% of %d string(s)" %
+                  (hits * 100.0 / (hits + misses), hits + misses))
+        if self.incremental:
+            self._save_incremental_state(output.digest)
 
-        output.close()
+        if not changed:
+            print("No changes detected - will not overwrite project file for " + self.project.get_name())
 
 #
 #
@@ -413,33 +488,29 @@ class ProjectGenerator:
 
 class WorkspaceGenerator:
 
-    def __init__(self, project_definition, workspace_name, project_generators):
+    def __init__(self, project_definition, workspace_name, project_names, outputs):
         self.workspace_name = workspace_name
+        self.outputs = outputs
         self.project_definition = project_definition
-        self.project_generators = project_generators
+        self.project_names = project_names
 
     def write(self):
 
-        output = StringIO()
+        workspace_folder = self.project_definition.get_absolute_build_path() + self.workspace_name + ".xcworkspace"
+
+        project_file = workspace_folder + "/contents.xcworkspacedata"
+        output = self.outputs.open(project_file, late=True)
         output.write("<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n")
         output.write("<Workspace version = \"1.0\">\n")
-        for gen in self.project_generators:
-            output.write("  <FileRef location = \"group:" + gen.get_project_name() + ".xcodeproj\"></FileRef>\n")
+        for project_name in self.project_names:
+            output.write("  <FileRef location = \"group:" + project_name + ".xcodeproj\"></FileRef>\n")
         output.write("</Workspace>\n")
 
-        new_content = output.getvalue()
-
-        workspace_folder = self.project_definition.get_absolute_build_path() + self.workspace_name + ".xcworkspace"
-        if not os.path.exists(workspace_folder):
-            os.makedirs(workspace_folder)
-
-        project_file = workspace_folder + "/contents.xcworkspacedata"
-        if not overwrite_file_if_different(project_file, new_content):
+        if not output.close():
             print("No changes detected - will not overwrite workspace file")
 
-        output.close()
-
-        output = StringIO()
+        settings_file = workspace_folder + "/xcshareddata/WorkspaceSettings.xcsettings"
+        output = self.outputs.open(settings_file, late=True)
         output.write("<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n")
         output.write("<!DOCTYPE plist PUBLIC \"-//Apple//DTD PLIST 1.0//EN\" \"http://www.apple.com/DTDs/PropertyList-1.0.dtd\">\n")
         output.write("<plist version=\"1.0\">\n")
@@ -449,49 +520,124 @@ class WorkspaceGenerator:
         output.write("</dict>\n")
         output.write("</plist>\n")
 
-        new_content = output.getvalue()
-        shared_data_folder = workspace_folder + "/xcshareddata"
-        if not os.path.exists(shared_data_folder):
-            os.makedirs(shared_data_folder)
-
-        settings_file = shared_data_folder + "/WorkspaceSettings.xcsettings"
-        if not overwrite_file_if_different(settings_file, new_content):
+        if not output.close():
             print("No changes detected - will not overwrite workspace settings file")
 
-        output.close()
+# Manifest of written files is named after the generator, not the workspace, so that
+# files of renamed workspace are still known (and removed as stale)
+def create_outputs(project, args):
+    return OutputWriter(project.get_absolute_build_path() + "xcode.outputs.json",
+                        remove_stale=not args.keep_stale,
+                        dry_run=args.dry_run or args.check)
+
+# Sources and Products projects share nothing but the (read only) project definition,
+# so they can be generated by these functions concurrently, Products in a worker process.
+# Staged files are returned to the main process, which commits them together with the
+# workspace.
+
+def generate_sources(project, args):
+    outputs = create_outputs(project, args)
+    try:
+        gen_sources = ProjectGenerator(project, "Sources", outputs, args.legacy_ids, not args.no_incremental)
+        gen_sources.generate_targets_for_indexing()
+        gen_sources.write()
+    except BaseException:
+        outputs.discard()
+        raise
+    return outputs.get_results()
+
+def generate_products(project, args):
+    outputs = create_outputs(project, args)
+    try:
+        gen_products = ProjectGenerator(project, "Products", outputs, args.legacy_ids, not args.no_incremental)
+        gen_products.generate_targets_for_products()
+        gen_products.write()
+        gen_products.write_build_script()
+    except BaseException:
+        outputs.discard()
+        raise
+    return outputs.get_results()
+
+def _run_worker(function, project, args, connection):
+    try:
+        connection.send((True, function(project, args)))
+    except BaseException:
+        import traceback
+        connection.send((False, traceback.format_exc()))
+    connection.close()
 
 def run():
 
-    if len(sys.argv) != 2 and len(sys.argv) != 3:
-        print("Usage: " + sys.argv[0] + " <path-to-json-file> [workspace-name]")
-        exit(1)
-
-    path_to_file = sys.argv[1]
-    workspace_name = "Workspace"
-    if len(sys.argv) == 3:
-        workspace_name = sys.argv[2]
-
-    with open(path_to_file, "r") as json_file:
+    parser = argparse.ArgumentParser(description="Generates Xcode workspace from GN JSON project file")
+    parser.add_argument("json_file", help="path to JSON file generated by gn")
+    parser.add_argument("workspace_name", nargs="?", default="Workspace", help="name of the workspace")
+    parser.add_argument("--keep-stale", action="store_true",
+                        help="only report files generated by previous run that are no longer generated")
+    parser.add_argument("--legacy-ids", action="store_true",
+                        help="generate object IDs compatible with projects generated by older versions")
+    parser.add_argument("--no-incremental", action="store_true",
+                        help="always serialize complete projects instead of reusing unchanged objects from previous project files")
+    parser.add_argument("--parallel", action="store_true",
+                        help="generate Products project in worker process while Sources project is generated")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="only report files that would be created, changed or deleted")
+    parser.add_argument("--check", action="store_true",
+                        help="don't write anything, exit with non-zero status if generated files are out of date")
+    args = parser.parse_args()
+
+    workspace_name = args.workspace_name
+
+    with open(args.json_file, "r") as json_file:
         v = json_file.read()
         json_file.close()
         js = json.loads(v)
 
         project = Project(js)
 
-        gen_sources = ProjectGenerator(project, "Sources")
-        gen_sources.generate_targets_for_indexing()
-        gen_sources.write()
+        outputs = create_outputs(project, args)
 
-        gen_products = ProjectGenerator(project, "Products")
-        gen_products.generate_targets_for_products()
-        gen_products.write()
-        gen_products.write_build_script()
-
-        # Put products first so that when xcode autogenerates schemes product schemes
-        # (which are actually relevant) are placed first
-        gen_workspace = WorkspaceGenerator(project, workspace_name, [gen_products, gen_sources])
-        gen_workspace.write()
-
-run()
-#import cProfile
-#cProfile.run("run()")
\ No newline at end of file
+        try:
+            if not args.parallel:
+                outputs.merge(generate_sources(project, args))
+                outputs.merge(generate_products(project, args))
+            else:
+                # worker gets parsed project definition (inherited when forked, pickled otherwise)
+                receiver, sender = multiprocessing.Pipe(False)
+                worker = multiprocessing.Process(target=_run_worker,
+                                                 args=(generate_products, project, args, sender))
+                worker.start()
+                # only worker holds sending end now, so recv() fails when worker dies without result
+                sender.close()
+                try:
+                    outputs.merge(generate_sources(project, args))
+                finally:
+                    # worker results are merged even if Sources failed, so that they are discarded too
+                    try:
+                        success, results = receiver.recv()
+                    except EOFError:
+                        success, results = False, None
+                    worker.join()
+                    if success:
+                        outputs.merge(results)
+                if not success:
+                    raise Exception("Generating Products project failed:\n" +
+                                    (results or "worker process exited with code %s" % worker.exitcode))
+
+            # Put products first so that when xcode autogenerates schemes product schemes
+            # (which are actually relevant) are placed first
+            gen_workspace = WorkspaceGenerator(project, workspace_name, ["Products", "Sources"], outputs)
+            gen_workspace.write()
+        except BaseException:
+            outputs.discard()
+            raise
+
+        outputs.commit()
+
+        if args.check and outputs.has_changes():
+            print("Generated files are out of date")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    run()
+    #import cProfile
+    #cProfile.run("run()")
\ No newline at end of file